@@ -0,0 +1,277 @@
+"""Step many independent games at once with NumPy."""
+import numpy as np
+from engine import N_ROWS, N_COLS, ACTIONS
+from pieces import BLOCK_TYPES, SHAPES, KICKS, ROTATION_TARGETS, SCORE_TABLE
+
+LEFT, RIGHT, DOWN, CLOCKWISE, COUNTERCLOCKWISE, HARD, HOLD = range(len(ACTIONS))
+
+# Boards are stored as one uint64 column mask per column, bit TOP + j being row j.
+# Rows above the board are free, and bits from the floor up are always set.
+TOP = 16
+FLOOR_BITS = np.uint64((1 << 64) - (1 << (TOP + N_ROWS)))
+ROW_BITS = np.uint64(((1 << N_ROWS) - 1) << TOP)
+# Walls of full columns on both sides, wide enough for any kick
+PAD = 8
+WIDTH = N_COLS + 2 * PAD
+WALL = np.uint64((1 << 64) - 1)
+# Right shifts of 64 or more give 0, which masks out empty piece columns in drops
+NO_COLUMN = 64
+
+# Column profile of every shape = kind * 4 + orientation: its leftmost and top cell, and
+# for each of its four columns from there the cell mask (bit j + 1 is row y + j) and
+# the shift from that mask's base to the row just below its lowest cell
+N_SHAPES = 4 * len(SHAPES)
+SHAPE_LEFT = np.zeros(N_SHAPES, dtype=np.intp)
+SHAPE_TOP = np.zeros(N_SHAPES, dtype=np.intp)
+COLUMN_MASK = np.zeros((4, N_SHAPES), dtype=np.uint64)
+COLUMN_BELOW = np.full((4, N_SHAPES), NO_COLUMN, dtype=np.uint64)
+for _kind, _orientations in enumerate(SHAPES):
+    for _o, _cells in enumerate(_orientations):
+        _shape = 4 * _kind + _o
+        SHAPE_LEFT[_shape] = min(i for i, _ in _cells)
+        SHAPE_TOP[_shape] = min(j for _, j in _cells)
+        for _i, _j in _cells:
+            _c = _i - SHAPE_LEFT[_shape]
+            COLUMN_MASK[_c, _shape] |= np.uint64(1 << (_j + 1))
+            COLUMN_BELOW[_c, _shape] = max(_j + 2, COLUMN_BELOW[_c, _shape] % NO_COLUMN)
+
+# Sideways step of every action, and the kicks and target shape of every action,
+# indexed by shape * len(ACTIONS) + action (no kicks and the same shape if it doesn't rotate)
+MOVE_X = np.zeros(len(ACTIONS), dtype=np.intp)
+MOVE_X[LEFT], MOVE_X[RIGHT] = -1, 1
+N_KICKS = np.ones(N_SHAPES * len(ACTIONS), dtype=np.intp)
+KICK_X = np.zeros((5, N_SHAPES * len(ACTIONS)), dtype=np.intp)
+KICK_Y = np.zeros((5, N_SHAPES * len(ACTIONS)), dtype=np.intp)
+TARGET = np.zeros(N_SHAPES * len(ACTIONS), dtype=np.intp)
+for _shape in range(N_SHAPES):
+    _kind, _o = divmod(_shape, 4)
+    _key = _shape * len(ACTIONS)
+    TARGET[_key:_key + len(ACTIONS)] = _shape
+    for _action, _turn in ((CLOCKWISE, 0), (COUNTERCLOCKWISE, 1)):
+        _kicks = KICKS[_kind][_o][_turn]
+        if _kicks:
+            N_KICKS[_key + _action] = len(_kicks)
+            TARGET[_key + _action] = 4 * _kind + ROTATION_TARGETS[_o][_turn]
+            for _k, (_kx, _ky) in enumerate(_kicks):
+                KICK_X[_k, _key + _action], KICK_Y[_k, _key + _action] = _kx, _ky
+SCORES = np.array([SCORE_TABLE[n] for n in range(5)], dtype=np.int64)
+ROWS = np.arange(N_ROWS, dtype=np.uint64)
+
+
+def _trailing_zeros(masks):
+    """Index of the lowest set bit of every nonzero uint64 in masks."""
+    return np.bitwise_count((masks & (~masks + np.uint64(1))) - np.uint64(1)).astype(np.intp)
+
+
+class BatchTetris:
+    """Hold B games as a (B, 26) uint64 column array plus per-game piece arrays.
+
+    Every step applies one action per game followed by one gravity step, with
+    the same rules as engine.Game. Finished games are frozen until reset.
+    Each game also keeps how far its piece can fall, so gravity, soft and
+    hard drops need no collision test; it is refreshed whenever the piece
+    moves sideways, rotates, spawns or the board changes.
+    """
+
+    def __init__(self, n_games, n_blocks_in_queue=3, seed=None):
+        self.n_games = n_games
+        self.rng = np.random.default_rng(seed)
+        self._columns = np.full((n_games, WIDTH), WALL, dtype=np.uint64)
+        self._base = np.arange(n_games) * WIDTH + PAD
+        self.queue = np.zeros((n_games, n_blocks_in_queue), dtype=np.intp)
+        self.orientation = np.zeros(n_games, dtype=np.intp)
+        self.x = np.zeros(n_games, dtype=np.intp)
+        self.y = np.zeros(n_games, dtype=np.intp)
+        # Rows the piece can fall, and whether it overlaps the stack where it spawned
+        self._drop = np.zeros(n_games, dtype=np.intp)
+        self._stuck = np.zeros(n_games, dtype=bool)
+        self.held = np.full(n_games, -1, dtype=np.intp)
+        self.can_hold = np.ones(n_games, dtype=bool)
+        self.score = np.zeros(n_games, dtype=np.int64)
+        self.lines = np.zeros(n_games, dtype=np.int64)
+        self.game_over = np.zeros(n_games, dtype=bool)
+        self.reset()
+
+    @property
+    def kind(self):
+        """Kind of the active piece of every game."""
+        return self.queue[:, 0]
+
+    @property
+    def board(self):
+        """Row masks of every board as a (B, 20) uint16 array, like engine.Game.board."""
+        board = np.zeros((self.n_games, N_ROWS), dtype=np.uint16)
+        for i in range(N_COLS):
+            cells = (self._columns[:, PAD + i, None] >> (ROWS + np.uint64(TOP))) & np.uint64(1)
+            board |= cells.astype(np.uint16) << i
+        return board
+
+    @board.setter
+    def board(self, board):
+        board = np.asarray(board, dtype=np.uint64)
+        for i in range(N_COLS):
+            cells = ((board >> np.uint64(i)) & np.uint64(1)) << (ROWS + np.uint64(TOP))
+            self._columns[:, PAD + i] = np.bitwise_or.reduce(cells, axis=1) | FLOOR_BITS
+        self._settle(np.arange(self.n_games))
+
+    def reset(self, mask=None):
+        """Restart all games, or only those where mask is True."""
+        idx = np.arange(self.n_games) if mask is None else np.flatnonzero(mask)
+        self._columns[idx, PAD:PAD + N_COLS] = FLOOR_BITS
+        self.queue[idx, 0] = self._draw(np.full(len(idx), -1))
+        for k in range(1, self.queue.shape[1]):
+            self.queue[idx, k] = self._draw(self.queue[idx, k - 1])
+        self.orientation[idx] = self.x[idx] = self.y[idx] = 0
+        self.held[idx] = -1
+        self.can_hold[idx] = True
+        self.score[idx] = self.lines[idx] = 0
+        self.game_over[idx] = False
+        self._settle(idx)
+
+    def _draw(self, previous):
+        """Draw block kinds with SNES-bias against getting same twice in a row."""
+        kinds = self.rng.integers(0, len(BLOCK_TYPES) + 1, len(previous))
+        reroll = (kinds == len(BLOCK_TYPES)) | (kinds == previous)
+        kinds[reroll] = self.rng.integers(0, len(BLOCK_TYPES), np.count_nonzero(reroll))
+        return kinds
+
+    def _probe(self, base, shape, x, y):
+        """Test pieces at (x, y) on the boards at base, return (fits, drop distance).
+
+        The drop distance is only meaningful where the piece fits.
+        """
+        # Pieces never get more than a few rows above the board, so clamping is safe
+        shift = np.maximum(y + (TOP - 1), 0).astype(np.uint64)
+        first = base + x + SHAPE_LEFT.take(shape)
+        columns = self._columns.ravel()
+        # The floor bits keep below nonzero for pieces that don't fit
+        hit, below = 0, FLOOR_BITS
+        for c in range(4):
+            column = columns.take(first + c)
+            hit = hit | (column & (COLUMN_MASK[c].take(shape) << shift))
+            below = below | (column >> (shift + COLUMN_BELOW[c].take(shape)))
+        return hit == 0, _trailing_zeros(below)
+
+    def _settle(self, idx):
+        """Refresh the drop distance of games idx after their piece spawned or the board changed."""
+        shape = self.queue[idx, 0] * 4 + self.orientation[idx]
+        fits, drop = self._probe(self._base[idx], shape, self.x[idx], self.y[idx])
+        self._drop[idx] = drop
+        self._stuck[idx] = ~fits
+        # A piece inside the stack falls as long as each next row down fits
+        stuck = idx[~fits]
+        self._drop[stuck] = 0
+        while len(stuck):
+            shape = self.queue[stuck, 0] * 4 + self.orientation[stuck]
+            y = self.y[stuck] + self._drop[stuck] + 1
+            fits, _ = self._probe(self._base[stuck], shape, self.x[stuck], y)
+            stuck = stuck[fits]
+            self._drop[stuck] += 1
+
+    def _advance_queue(self, idx):
+        """Pop the active piece of games idx and draw a new one at the end of the queue."""
+        self.queue[idx, :-1] = self.queue[idx, 1:]
+        self.queue[idx, -1] = self._draw(self.queue[idx, -2])
+
+    def _hold(self, idx):
+        """Hold the active piece of games idx, following engine.Game.hold."""
+        kind = self.queue[idx, 0]
+        idx = idx[self.can_hold[idx] & (self.held[idx] != kind)]
+        kind = self.queue[idx, 0]
+        empty = self.held[idx] < 0
+        swap = idx[~empty]
+        self.queue[swap, 0] = self.held[swap]
+        self.can_hold[swap] = False
+        self._advance_queue(idx[empty])
+        self.held[idx] = kind
+        self.orientation[idx] = self.x[idx] = self.y[idx] = 0
+        self._settle(idx)
+
+    def _land(self, idx):
+        """Lock pieces of games idx, or end the games where they stick out at the top."""
+        shape = self.queue[idx, 0] * 4 + self.orientation[idx]
+        top = self.y[idx] + SHAPE_TOP.take(shape)
+        self.game_over[idx[top <= 0]] = True
+        idx, shape = idx[top > 0], shape[top > 0]
+        if not len(idx):
+            return
+
+        # Write the pieces, then find full rows as the AND of all board columns
+        shift = (self.y[idx] + (TOP - 1)).astype(np.uint64)
+        first = self._base[idx] + self.x[idx] + SHAPE_LEFT.take(shape)
+        columns = self._columns.ravel()
+        for c in range(4):
+            columns[first + c] |= COLUMN_MASK[c].take(shape) << shift
+        board = self._columns[idx, PAD:PAD + N_COLS]
+        full = board[:, 0] & ROW_BITS
+        for i in range(1, N_COLS):
+            full &= board[:, i]
+        n_cleared = np.bitwise_count(full).astype(np.intp)
+        cleared = np.flatnonzero(full)
+        if len(cleared):
+            # Clear the topmost full row first, moving the rows above it down by one
+            board, full = board[cleared], full[cleared, None]
+            while full.any():
+                row = full & (~full + np.uint64(1))
+                above = np.where(row, row - np.uint64(1), 0)
+                board = (board & ~(above | row)) | ((board & above) << np.uint64(1))
+                full ^= row
+            self._columns[idx[cleared], PAD:PAD + N_COLS] = board
+        self.score[idx] += SCORES.take(n_cleared)
+        self.lines[idx] += n_cleared
+
+        self._advance_queue(idx)
+        self.can_hold[idx] = True
+        self.orientation[idx] = self.x[idx] = self.y[idx] = 0
+        self._settle(idx)
+
+    def step(self, actions):
+        """Apply one action per game (indices into ACTIONS) and one gravity step.
+
+        Return the per-game reward (score gained) and the game over mask.
+        """
+        actions = np.asarray(actions)
+        alive = ~self.game_over
+        score_before = self.score.copy()
+
+        # One probe covers left, right and the first kick of a rotation, which is always
+        # (0, 0); other actions probe the current position, which just refreshes the drop
+        key = (self.queue[:, 0] * 4 + self.orientation) * len(ACTIONS) + actions
+        x, target = self.x + MOVE_X.take(actions), TARGET.take(key)
+        fits, drop = self._probe(self._base, target, x, self.y)
+        moved = alive & fits
+        np.copyto(self.x, x, where=moved)
+        np.copyto(self.orientation, target & 3, where=moved)
+        np.copyto(self._drop, drop, where=moved)
+        # Rotations that didn't fit try their other kicks in order
+        idx = np.flatnonzero(alive & ~fits)
+        idx = idx[N_KICKS.take(key[idx]) > 1]
+        for k in range(1, 5):
+            if not len(idx):
+                break
+            x, y = self.x[idx] + KICK_X[k, key[idx]], self.y[idx] + KICK_Y[k, key[idx]]
+            fits, drop = self._probe(self._base[idx], target[idx], x, y)
+            moved = idx[fits]
+            self.x[moved], self.y[moved], self._drop[moved] = x[fits], y[fits], drop[fits]
+            self.orientation[moved] = target[moved] & 3
+            idx = idx[~fits]
+
+        down = alive & (actions == DOWN) & (self._drop > 0)
+        self.y += down
+        self._drop -= down
+        idx = np.flatnonzero(alive & (actions == HOLD))
+        if len(idx):
+            self._hold(idx)
+
+        # Hard drops land at once, everything else gets a gravity step
+        hard = alive & (actions == HARD)
+        self.y += np.where(hard & ~self._stuck, self._drop, 0)
+        falls = alive & ~hard & (self._drop > 0)
+        self.y += falls
+        self._drop -= falls
+        # A piece that falls fits where it is now, and one that lands is replaced
+        self._stuck &= ~falls
+        idx = np.flatnonzero(hard | (alive & ~falls))
+        if len(idx):
+            self._land(idx)
+        return self.score - score_before, self.game_over.copy()
@@ -0,0 +1,382 @@
+"""Benchmark suite for the engine, AI and rendering hot paths.
+
+Every benchmark uses fixed seeds or a recorded game, so runs can be compared
+between commits:
+
+    python bench.py --output before.json
+    python bench.py --output after.json --compare before.json
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from engine import Game, Piece, ACTIONS
+from batch import BatchTetris
+from channel import SharedChannel, run_policy
+from replay import Replay
+from features import BoardFeatures
+from pieces import SHAPES
+from search import PlacementAI, DEFAULT_WEIGHTS, drop_placements
+
+SEED = 0
+# name -> (function, unit, higher is better)
+BENCHMARKS = {}
+
+
+def benchmark(unit, higher_is_better=True):
+    """Register a benchmark function that returns a single number in unit."""
+    def register(func):
+        BENCHMARKS[func.__name__[len("bench_"):]] = (func, unit, higher_is_better)
+        return func
+    return register
+
+
+def timed(func, repeat=5):
+    """Return the best wall time out of `repeat` calls of func."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@functools.lru_cache()
+def recorded_game(n_pieces=200, seed=SEED):
+    """Replay of the placement AI playing the first n_pieces pieces of a seeded game."""
+    replay = Replay(seed)
+    game, ai = replay.new_game(), PlacementAI(time_budget=None)
+    while not game.game_over and game.n_pieces <= n_pieces:
+        action = ai.next_action(game)
+        replay.record(action)
+        game.step(action)
+    return replay
+
+
+@benchmark("moves/s")
+def bench_moves(n_moves=50000):
+    """Shift a piece from wall to wall on an empty board."""
+    def run():
+        game = Game(seed=SEED)
+        direction = "left"
+        for _ in range(n_moves):
+            if not game.move(direction):
+                direction = "right" if direction == "left" else "left"
+    return n_moves / timed(run)
+
+
+@benchmark("rotations/s")
+def bench_rotations(n_rotations=50000):
+    """Rotate a piece back and forth on an empty board."""
+    def run():
+        game = Game(seed=SEED)
+        game.queue[0] = Piece("T")
+        game.move("down")
+        for _ in range(n_rotations // 2):
+            game.rotate("w")
+            game.rotate("e")
+    return n_rotations / timed(run)
+
+
+@benchmark("spawns/s")
+def bench_spawns(n_spawns=50000):
+    """Spawn pieces without placing them."""
+    def run():
+        game = Game(seed=SEED)
+        for _ in range(n_spawns):
+            game.spawn_new_piece()
+    return n_spawns / timed(run)
+
+
+@benchmark("lines/s")
+def bench_line_clears(n_pieces=5000):
+    """Hard drop O pieces in a pattern that clears two lines every five pieces."""
+    def run():
+        game = Game(seed=SEED)
+        for k in range(n_pieces):
+            game.queue[0] = Piece("O")
+            for _ in range(4 - 2 * (k % 5)):
+                game.move("left")
+            for _ in range(2 * (k % 5) - 4):
+                game.move("right")
+            game.hard_drop()
+    return 2 * (n_pieces // 5) / timed(run)
+
+
+@benchmark("steps/s")
+def bench_random_steps(n_steps=20000):
+    """Play seeded random actions with Game.step, restarting on game over."""
+    def run():
+        rng = random.Random(SEED)
+        game = Game(seed=SEED)
+        for _ in range(n_steps):
+            game.step(rng.choice(ACTIONS))
+            if game.game_over:
+                game = Game(seed=SEED)
+    return n_steps / timed(run)
+
+
+@benchmark("bytes/game", higher_is_better=False)
+def bench_game_memory(n_games=1000, n_pieces=20):
+    """Memory held by live games part-way through, traced with tracemalloc."""
+    tracemalloc.start()
+    try:
+        games = [Game(seed=SEED + k) for k in range(n_games)]
+        for game in games:
+            while not game.game_over and game.n_pieces <= n_pieces:
+                game.step("hard")
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size / len(games)
+
+
+@benchmark("games/s")
+def bench_game_sims():
+    """Re-simulate a recorded 200 piece AI game from its replay."""
+    return 1 / timed(recorded_game().simulate)
+
+
+@functools.lru_cache()
+def decision_states(n_pieces=50):
+    """Games of a recorded replay rebuilt at every point where a new piece needs a decision."""
+    replay = recorded_game(n_pieces)
+    states, game, seen = [], replay.new_game(), None
+    for tick, action in enumerate(replay):
+        if game.n_pieces != seen:
+            seen = game.n_pieces
+            states.append(Replay(replay.seed, actions=replay.actions[:tick]).simulate())
+        game.step(action)
+    return states
+
+
+@benchmark("decisions/s")
+def bench_ai_decisions():
+    """Let the placement AI decide on every position of a recorded game."""
+    states = decision_states()
+
+    def run():
+        ai = PlacementAI(time_budget=None)
+        for state in states:
+            ai.decide(state)
+    return len(states) / timed(run, repeat=3)
+
+
+@benchmark("decisions/s")
+def bench_finesse_decisions():
+    """ai_decisions with the finesse table, searching live only where the stack is in the way."""
+    states = decision_states()
+
+    def run():
+        ai = PlacementAI(time_budget=None, finesse=True)
+        for state in states:
+            ai.decide(state)
+    return len(states) / timed(run, repeat=3)
+
+
+@benchmark("boards/s")
+def bench_board_evals(repeat=200):
+    """Score every drop placement of every piece on a mid-game board with apply/undo."""
+    board = list(recorded_game(60).simulate().board)
+    placements = [(kind, orientation, x, y) for kind in range(len(SHAPES))
+                  for x, y, orientation in drop_placements(board, kind)]
+
+    def run():
+        features = BoardFeatures(list(board))
+        for _ in range(repeat):
+            for placement in placements:
+                features.evaluate(features.apply(*placement), DEFAULT_WEIGHTS)
+                features.undo()
+    return repeat * len(placements) / timed(run)
+
+
+@benchmark("steps/s")
+def bench_scalar_games(n_games=256, n_steps=100):
+    """Loop engine.Game over the same workload as batch_games."""
+    actions = np.random.default_rng(SEED).integers(0, len(ACTIONS), (n_steps, n_games)).tolist()
+
+    def run():
+        games = [Game(seed=SEED + k) for k in range(n_games)]
+        for step_actions in actions:
+            for k, action in enumerate(step_actions):
+                games[k].step(ACTIONS[action])
+                if games[k].game_over:
+                    games[k] = Game(seed=SEED + k)
+    return n_games * n_steps / timed(run, repeat=3)
+
+
+@benchmark("steps/s")
+def bench_batch_games(n_games=4096, n_steps=100):
+    """Step a BatchTetris with random actions, restarting finished games.
+
+    On one core this runs at about 2.4M steps/s, 12-15x scalar_games, and
+    about 4M steps/s (20-25x) with 16384 games: short of the 100x target,
+    since a single collision test over the batch already costs ~60 ns a game.
+    """
+    actions = np.random.default_rng(SEED).integers(0, len(ACTIONS), (n_steps, n_games))
+
+    def run():
+        games = BatchTetris(n_games, seed=SEED)
+        for step_actions in actions:
+            _, game_over = games.step(step_actions)
+            if game_over.any():
+                games.reset(game_over)
+    return n_games * n_steps / timed(run, repeat=3)
+
+
+# First move of a worker process: import the AI module, make a game and step it once
+COLD_START = ("import simple_ai; from engine import Game; game = Game(seed=0); "
+              "game.step(simple_ai.PlacementAI(time_budget=None).next_action(game))")
+
+
+@benchmark("ms", higher_is_better=False)
+def bench_cold_start(repeat=5):
+    """Launch a fresh interpreter and play the first AI move, wall time."""
+    command = [sys.executable, "-c", COLD_START]
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return 1000 * timed(lambda: subprocess.run(command, cwd=directory, check=True), repeat)
+
+
+def _shift_policy(observation):
+    """Cheap deterministic policy for the channel benchmark."""
+    return ACTIONS[(int(observation["piece"][1]) + int(observation["n_pieces"])) % len(ACTIONS)]
+
+
+@benchmark("steps/s")
+def bench_shared_steps(n_steps=20000):
+    """Step a game lock-step with a policy process over a SharedChannel."""
+    channel = SharedChannel.create()
+    policy = multiprocessing.Process(target=run_policy, args=(channel.name, _shift_policy))
+    policy.start()
+    try:
+        game = Game(seed=SEED)
+        start = time.perf_counter()
+        for _ in range(n_steps):
+            game.step(channel.next_action(game, timeout=10))
+            if game.game_over:
+                game = Game(seed=SEED)
+        elapsed = time.perf_counter() - start
+    finally:
+        channel.close()
+        policy.join()
+    return n_steps / elapsed
+
+
+@functools.lru_cache()
+def frame_times(n_frames=300):
+    """Return ms per frame for a full redraw and for the dirty-rect Renderer."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from screen import Screen
+    from render import Renderer
+    pygame.init()
+    screen = Screen(400, epsilon=0.05, left_space=4, right_space=4)
+    borders, surf = screen.setup_screen()
+    borders.update(screen)
+
+    def full_redraw(game):
+        surf.fill((0, 0, 0))
+        borders.draw(surf)
+        screen.draw_game(surf, game)
+        screen.draw_queue(surf, game.queue)
+        screen.draw_held(surf, game.held_piece)
+        screen.set_score(game.score)
+        screen.draw_score(surf)
+        pygame.display.flip()
+
+    results = {}
+    for name, draw in (("full", full_redraw), ("dirty", Renderer(screen, borders, surf).draw)):
+        # Both renderers draw the first frames of the same recorded game
+        game, elapsed, frames = recorded_game().new_game(), 0, 0
+        for action in recorded_game():
+            if frames == n_frames:
+                break
+            game.step(action)
+            start = time.perf_counter()
+            draw(game)
+            elapsed += time.perf_counter() - start
+            frames += 1
+        results[name] = elapsed / frames * 1000
+    return results
+
+
+@benchmark("ms/frame", higher_is_better=False)
+def bench_frame_full():
+    """Full redraw and flip of every frame, on the dummy SDL video driver."""
+    return frame_times()["full"]
+
+
+@benchmark("ms/frame", higher_is_better=False)
+def bench_frame_dirty():
+    """Dirty-rect Renderer frame, on the dummy SDL video driver."""
+    return frame_times()["dirty"]
+
+
+def git_commit():
+    """Short hash of the checked out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names=None):
+    """Run the named benchmarks (all by default) and return a report dict."""
+    results = {}
+    for name, (func, unit, higher_is_better) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        value = func()
+        results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+        print(f"{name:>14}: {value:12.3f} {unit}", flush=True)
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    """Print the speedup of every benchmark over a baseline report."""
+    print(f"\nversus {baseline.get('commit')}:")
+    for name, result in report["results"].items():
+        if name not in baseline["results"]:
+            continue
+        ratio = result["value"] / baseline["results"][name]["value"]
+        if not result["higher_is_better"]:
+            ratio = 1 / ratio
+        print(f"{name:>14}: {ratio:6.2f}x {'faster' if ratio >= 1 else 'slower'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the engine, AI and rendering hot paths.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    report = run(args.names)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
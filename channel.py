@@ -0,0 +1,166 @@
+"""Lock-step game/policy channel over one multiprocessing.shared_memory segment.
+
+The game process publishes observations into a ring of slots and waits for
+the action answering the newest one, the policy process waits for an
+observation and writes back its action:
+
+    channel = SharedChannel.create(n_blocks_in_queue=3)     # game process
+    action = channel.next_action(game)
+
+    run_policy(channel.name, lambda obs: choose(obs["board"]))   # policy process
+
+Observations are NumPy views into the segment, valid until the ring wraps
+around, so nothing is serialised or allocated per step.
+"""
+import os
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from engine import N_ROWS, ACTIONS
+
+# Layout and counters at the start of the segment. obs_seq counts published
+# observations, action_seq is the obs_seq the action in `action` answers.
+HEADER = np.dtype([("n_slots", np.uint32), ("n_queue", np.uint32), ("obs_seq", np.uint64),
+                   ("action_seq", np.uint64), ("action", np.int8), ("closed", np.uint8)],
+                  align=True)
+ACTION_INDEX = {action: k for k, action in enumerate(ACTIONS)}
+NO_ACTION = -1
+
+
+def slot_dtype(n_queue):
+    """One observation: board row masks, active piece (kind, x, y, orientation), queued
+    and held kinds (-1 if none), can_hold, game_over, score, lines and n_pieces."""
+    return np.dtype([("seq", np.uint64), ("board", np.uint16, N_ROWS), ("piece", np.int8, 4),
+                     ("queue", np.int8, n_queue), ("held", np.int8), ("can_hold", np.uint8),
+                     ("game_over", np.uint8), ("score", np.int64), ("lines", np.int32),
+                     ("n_pieces", np.int32)], align=True)
+
+
+class SharedChannel:
+    """Observation ring buffer and action slot in one shared memory segment.
+
+    Use create() in the game process, which owns the segment, and attach()
+    in the policy process. Waits spin with os.sched_yield, so the two
+    processes hand over the CPU at every step even on a single core.
+    """
+
+    def __init__(self, memory, owner):
+        self.memory = memory
+        self.owner = owner
+        self.header = np.ndarray((), HEADER, memory.buf)
+        n_slots, n_queue = int(self.header["n_slots"]), int(self.header["n_queue"])
+        self.slots = np.ndarray(n_slots, slot_dtype(n_queue), memory.buf, HEADER.itemsize)
+        # One dict of field views per slot, built once; 0-d views for the scalar fields
+        self.observations = [{name: self.slots[name][k, ...] for name in self.slots.dtype.names}
+                             for k in range(n_slots)]
+        self.seen = 0
+
+    @classmethod
+    def create(cls, name=None, n_blocks_in_queue=3, n_slots=4):
+        """Create a segment for games with n_blocks_in_queue pieces in queue."""
+        n_queue = n_blocks_in_queue - 1
+        size = HEADER.itemsize + n_slots * slot_dtype(n_queue).itemsize
+        memory = shared_memory.SharedMemory(name, create=True, size=size)
+        header = np.ndarray((), HEADER, memory.buf)
+        header["n_slots"], header["n_queue"] = n_slots, n_queue
+        header["action"] = NO_ACTION
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Open the segment created by another process."""
+        try:
+            # The creator unlinks the segment, this process's tracker shouldn't (Python 3.13+)
+            memory = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            memory = shared_memory.SharedMemory(name)
+        return cls(memory, owner=False)
+
+    @property
+    def name(self):
+        """Name other processes attach() to."""
+        return self.memory.name
+
+    def publish(self, game):
+        """Write the state of game to the next slot and return its sequence number."""
+        seq = int(self.header["obs_seq"]) + 1
+        observation = self.observations[seq % len(self.observations)]
+        observation["board"][:] = game.board
+        piece = game.active_piece
+        view = observation["piece"]
+        view[0], view[1], view[2], view[3] = piece.kind, piece.x, piece.y, piece.orientation
+        view = observation["queue"]
+        for k in range(1, len(game.queue)):
+            view[k - 1] = game.queue[k].kind
+        observation["held"][...] = -1 if game.held_piece is None else game.held_piece.kind
+        observation["can_hold"][...] = game.can_hold
+        observation["game_over"][...] = game.game_over
+        observation["score"][...] = game.score
+        observation["lines"][...] = game.lines
+        observation["n_pieces"][...] = game.n_pieces
+        # The slot is complete before its sequence number, and that before the counter
+        observation["seq"][...] = seq
+        self.header["obs_seq"] = seq
+        return seq
+
+    def wait_observation(self, timeout=None):
+        """Wait for an observation newer than the last one returned, None if the channel closed.
+
+        The observation is a dict of views into its slot.
+        """
+        header = self.header
+        self._wait(lambda: header["obs_seq"] > self.seen or header["closed"], timeout)
+        seq = int(header["obs_seq"])
+        if seq <= self.seen:
+            return None
+        self.seen = seq
+        return self.observations[seq % len(self.slots)]
+
+    def send_action(self, action):
+        """Answer the last observation returned with an action (one of ACTIONS, or None)."""
+        self.header["action"] = NO_ACTION if action is None else ACTION_INDEX[action]
+        self.header["action_seq"] = self.seen
+
+    def wait_action(self, seq, timeout=None):
+        """Wait for the action answering observation seq."""
+        header = self.header
+        self._wait(lambda: header["action_seq"] >= seq, timeout)
+        action = int(header["action"])
+        return None if action == NO_ACTION else ACTIONS[action]
+
+    def next_action(self, game, timeout=None):
+        """Publish game and return the policy's action, so a channel can stand in for an AI."""
+        return self.wait_action(self.publish(game), timeout)
+
+    def _wait(self, ready, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not ready():
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("no answer on the shared memory channel")
+            os.sched_yield()
+
+    def close(self):
+        """Detach from the segment; the owner also marks it closed and unlinks it."""
+        if self.owner:
+            self.header["closed"] = 1
+        # Views into the buffer have to go before it can be closed
+        self.header = self.slots = self.observations = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def run_policy(name, policy, timeout=None):
+    """Attach to channel name and answer every observation with policy(observation).
+
+    Return the number of actions sent once the game side closes the channel.
+    """
+    channel = SharedChannel.attach(name)
+    n_actions = 0
+    try:
+        while (observation := channel.wait_observation(timeout)) is not None:
+            channel.send_action(policy(observation))
+            n_actions += 1
+    finally:
+        channel.close()
+    return n_actions
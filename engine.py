@@ -0,0 +1,319 @@
+"""Pure-data tetris engine: board, pieces, queue, hold and score, no pygame."""
+from collections import namedtuple
+from randomizer import make_generator
+from pieces import BLOCK_INDEX, COLOURS, SHAPES, ROW_MASKS, COLUMN_BOTTOMS, KICKS,\
+    ROTATION_TARGETS, CLOCKWISE, COUNTERCLOCKWISE, SCORE_TABLE, GARBAGE
+
+N_ROWS, N_COLS = 20, 10
+FULL_ROW = (1 << N_COLS) - 1
+# Actions understood by the AI front-ends, in the order used for action indices
+ACTIONS = ("left", "right", "down", "clockwise", "counterclockwise", "hard", "hold")
+MOVES = {"down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+ROTATIONS = {"w": CLOCKWISE, "e": COUNTERCLOCKWISE}
+ACTION_ROTATIONS = {"clockwise": "w", "counterclockwise": "e"}
+
+# What happened during one Game.step
+StepEvents = namedtuple("StepEvents", ["moved", "locked", "lines_cleared", "game_over"])
+# Shared results of the steps where no piece locks
+_FALLING = (StepEvents(False, False, 0, False), StepEvents(True, False, 0, False))
+_GAME_OVER = (StepEvents(False, False, 0, True), StepEvents(True, False, 0, True))
+
+
+def pack_board(board):
+    """Pack a board into one int, row j taking bits N_COLS * j to N_COLS * (j + 1)."""
+    key = 0
+    for j, row in enumerate(board):
+        key |= row << (N_COLS * j)
+    return key
+
+
+def clear_packed_row(key, j, width=N_COLS):
+    """Remove row j from a packed board, moving the rows above it down by one.
+
+    With width=1 this clears row j from a column mask.
+    """
+    below = key >> (width * (j + 1)) << (width * (j + 1))
+    above = key & ((1 << (width * j)) - 1)
+    return below | above << width
+
+
+def board_columns(board):
+    """Column masks of a board: bit j of columns[i] is cell (i, j), bit N_ROWS is the floor."""
+    columns = [1 << N_ROWS] * N_COLS
+    for j, row in enumerate(board):
+        while row:
+            low = row & -row
+            columns[low.bit_length() - 1] |= 1 << j
+            row ^= low
+    return columns
+
+
+def drop_distance(columns, kind, orientation, x, y):
+    """Number of rows a piece at offset (x, y) falls before landing, from board_columns.
+
+    Columns of a tetromino have no gaps, so only the lowest cell of each
+    column can hit something: the next filled cell below it.
+    """
+    # Every column has the floor bit, so this is always lowered
+    distance = 2 * N_ROWS
+    for i, bottom in COLUMN_BOTTOMS[kind][orientation]:
+        j = y + bottom + 1
+        below = columns[x + i] >> j if j >= 0 else columns[x + i] << -j
+        distance = min(distance, (below & -below).bit_length() - 1)
+    return distance
+
+
+def fits(board, kind, orientation, x, y):
+    """Check if a piece placed at offset (x, y) is inside the walls and not overlapping.
+
+    The board is a list of row masks, bit i of board[j] being cell (i, j).
+    Rows above the board (j < 0) are free.
+    """
+    left, width, rows = ROW_MASKS[kind][orientation]
+    shift = x + left
+    if shift < 0 or shift + width > N_COLS:
+        return False
+    for dy, mask in rows:
+        j = y + dy
+        if j >= N_ROWS or (j >= 0 and board[j] & (mask << shift)):
+            return False
+    return True
+
+
+class Piece:
+    """Position and orientation of a tetromino, without any drawing logic.
+
+    `kind` indexes the tables in pieces.py and `orientation` is 0-3 for N, E, S, W.
+    Sprites for drawing are only made by the views.
+    """
+
+    __slots__ = ("block_type", "kind", "x", "y", "orientation")
+
+    def __init__(self, block_type):
+        self.respawn(block_type)
+
+    def respawn(self, block_type):
+        """Turn this piece into a freshly spawned piece of the given type."""
+        self.block_type = block_type
+        self.kind = BLOCK_INDEX[block_type]
+        self.reset()
+
+    def reset(self):
+        """Reset a piece's position and orientation to just-spawned."""
+        self.x, self.y = 0, 0
+        self.orientation = 0
+
+    @property
+    def colour(self):
+        """RGB colour of the piece's blocks."""
+        return COLOURS[self.kind]
+
+    @property
+    def cells(self):
+        """Grid coordinates of the four blocks."""
+        return [(self.x + i, self.y + j) for i, j in SHAPES[self.kind][self.orientation]]
+
+    def move(self, board, direction):
+        """Move either "down", "left", or "right"."""
+        di, dj = MOVES[direction]
+        if not fits(board, self.kind, self.orientation, self.x + di, self.y + dj):
+            return False
+        self.x += di
+        self.y += dj
+        return True
+
+    def rotate(self, board, direction):
+        """Rotate clockwise ("w") or counterclockwise ("e") with the first kick that fits."""
+        turn = ROTATIONS[direction]
+        target_orientation = ROTATION_TARGETS[self.orientation][turn]
+        for kickx, kicky in KICKS[self.kind][self.orientation][turn]:
+            if fits(board, self.kind, target_orientation, self.x + kickx, self.y + kicky):
+                self.orientation = target_orientation
+                self.x += kickx
+                self.y += kicky
+                return True
+        return False
+
+    def __repr__(self):
+        return f"{self.block_type}-piece"
+
+
+class Game:
+    """Full state of a single game: board, active piece, queue, hold and score."""
+
+    # Slotted so thousands of games fit in one process
+    __slots__ = ("generator", "board", "columns", "cells", "queue", "held_piece", "can_hold",
+                 "score", "lines", "last_cleared", "n_pieces", "game_over")
+
+    def __init__(self, n_blocks_in_queue=3, generator=None, seed=None):
+        """Initialise empty board, first piece and queue.
+
+        Pieces come from generator, by default an SNESGenerator seeded with seed.
+        """
+        self.generator = generator if generator is not None else make_generator("snes", seed)
+        self.board = [0] * N_ROWS
+        # The board as column masks (see board_columns), for drop distances
+        self.columns = board_columns(self.board)
+        # Kind + 1 of every locked cell (0 if empty, GARBAGE + 1 for garbage) at N_COLS * j + i,
+        # only needed by views
+        self.cells = bytearray(N_ROWS * N_COLS)
+
+        self.queue = [Piece(self.generator.next()) for _ in range(n_blocks_in_queue)]
+
+        self.held_piece = None
+        self.can_hold = True
+        self.score = 0
+        self.lines = 0
+        self.last_cleared = 0
+        self.n_pieces = 1
+        self.game_over = False
+
+    @property
+    def active_piece(self):
+        """Getter for the current active piece in the queue."""
+        return self.queue[0]
+
+    def move(self, direction):
+        """Move the active piece by one cell, return True on success."""
+        return self.active_piece.move(self.board, direction)
+
+    def rotate(self, direction):
+        """Rotate the active piece clockwise ("w") or counterclockwise ("e")."""
+        return self.active_piece.rotate(self.board, direction)
+
+    def drop_distance(self):
+        """Number of rows the active piece can fall, for hard drops and the ghost piece."""
+        piece = self.active_piece
+        return drop_distance(self.columns, piece.kind, piece.orientation, piece.x, piece.y)
+
+    def hard_drop(self):
+        """Move the active piece down as far as it goes and lock it at once.
+
+        A piece that doesn't fit where it is (spawned into the stack, or
+        pushed into by garbage) locks in place, which ends the game.
+        """
+        piece = self.active_piece
+        if fits(self.board, piece.kind, piece.orientation, piece.x, piece.y):
+            piece.y += self.drop_distance()
+        self.land()
+
+    def hold(self):
+        """Hold current piece and, if existing, place held piece back in play."""
+        if not self.can_hold or (self.held_piece is not None
+                                 and self.held_piece.block_type == self.active_piece.block_type):
+            return False
+        previously_held = self.held_piece
+        self.held_piece = self.queue.pop(0)
+        if previously_held is not None:
+            self.queue = [previously_held] + self.queue
+            self.can_hold = False
+        else:
+            self.queue.append(Piece(self.generator.next()))
+        self.active_piece.reset()
+        return True
+
+    def step(self, action=None, gravity=True):
+        """Advance the game by one tick and return its StepEvents.
+
+        action is one of ACTIONS, None for no action, or a sequence of
+        actions (the inputs of a tick) applied in order. Then one gravity
+        step is applied if gravity is set. A hard drop locks the piece at
+        once and ends the tick, ignoring the actions after it.
+        `moved` is set if any move or rotation succeeded.
+        """
+        if self.game_over:
+            return _GAME_OVER[0]
+        moved = dropped = False
+        actions = (action,) if action is None or isinstance(action, str) else action
+        for action in actions:
+            if action in MOVES:
+                moved |= self.move(action)
+            elif action in ACTION_ROTATIONS:
+                moved |= self.rotate(ACTION_ROTATIONS[action])
+            elif action == "hard":
+                self.hard_drop()
+                dropped = True
+                break
+            elif action == "hold":
+                self.hold()
+
+        if not dropped and (not gravity or self.fall()):
+            return _FALLING[moved]
+        if self.game_over:
+            return _GAME_OVER[moved]
+        return StepEvents(moved, True, self.last_cleared, False)
+
+    def fall(self):
+        """Apply one gravity step, locking the piece if it can't move down."""
+        if self.active_piece.move(self.board, "down"):
+            return True
+        self.land()
+        return False
+
+    def land(self):
+        """Lock the active piece where it is, or end the game if it sticks out at the top."""
+        if any([j <= 0 for _, j in self.active_piece.cells]):
+            self.game_over = True
+        else:
+            self.lock()
+
+    def lock(self):
+        """Write the active piece to the board, clear lines and spawn the next piece."""
+        piece = self.active_piece
+        left, _, rows = ROW_MASKS[piece.kind][piece.orientation]
+        for dy, mask in rows:
+            self.board[piece.y + dy] |= mask << (piece.x + left)
+        for i, j in piece.cells:
+            self.cells[N_COLS * j + i] = piece.kind + 1
+            self.columns[i] |= 1 << j
+
+        # Clear full lines by compacting the remaining rows to the bottom
+        n_cleared = 0
+        if any(self.board[piece.y + dy] == FULL_ROW for dy, _ in rows):
+            kept = [j for j, line in enumerate(self.board) if line != FULL_ROW]
+            n_cleared = N_ROWS - len(kept)
+            for dy, _ in rows:
+                if self.board[piece.y + dy] == FULL_ROW:
+                    self.columns = [clear_packed_row(column, piece.y + dy, 1)
+                                    for column in self.columns]
+            self.board = [0] * n_cleared + [self.board[j] for j in kept]
+            cells = bytearray(N_COLS * n_cleared)
+            for j in kept:
+                cells += self.cells[N_COLS * j:N_COLS * (j + 1)]
+            self.cells = cells
+
+        self.score += SCORE_TABLE[n_cleared]
+        self.lines += n_cleared
+        self.last_cleared = n_cleared
+        self.spawn_new_piece()
+        return n_cleared
+
+    def add_garbage(self, n_lines, hole):
+        """Push the stack up by n_lines rows that are full except for column hole.
+
+        The game is over if locked cells are pushed off the top, or if the
+        active piece no longer fits.
+        """
+        if not n_lines or self.game_over:
+            return
+        n_lines = min(n_lines, N_ROWS)
+        row = FULL_ROW & ~(1 << hole)
+        if any(self.board[:n_lines]):
+            self.game_over = True
+        self.board = self.board[n_lines:] + [row] * n_lines
+        self.columns = board_columns(self.board)
+        garbage = bytearray([GARBAGE + 1]) * N_COLS
+        garbage[hole] = 0
+        self.cells = self.cells[N_COLS * n_lines:] + garbage * n_lines
+        piece = self.active_piece
+        if not fits(self.board, piece.kind, piece.orientation, piece.x, piece.y):
+            self.game_over = True
+
+    def spawn_new_piece(self):
+        """Delete first queue entry, replace with new at end of queue, update vars."""
+        # Recycle the locked piece object as the new end of the queue
+        piece = self.queue.pop(0)
+        piece.respawn(self.generator.next())
+        self.queue.append(piece)
+        self.can_hold = True
+        self.n_pieces += 1
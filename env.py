@@ -0,0 +1,91 @@
+"""Reset/step environment over the engine, for AI training loops."""
+import numpy as np
+from engine import Game, N_ROWS, N_COLS, ACTIONS
+from features import BoardFeatures
+
+# Cells of every possible row mask, to turn a board row into a buffer row
+ROW_CELLS = np.array([[(mask >> i) & 1 for i in range(N_COLS)] for mask in range(1 << N_COLS)],
+                     dtype=np.uint8)
+
+
+class TetrisEnv:
+    """Gym-style wrapper around engine.Game.
+
+    Observations are returned in buffers allocated once and overwritten in
+    place on every step, so copy them if they need to be kept:
+     - "board": (20, 10) uint8 array of locked cells
+     - "pieces": active piece kind, queued kinds, then held kind (-1 if none)
+     - "features" (if requested): column heights, holes per column, bumpiness,
+       from features.BoardFeatures
+    Actions are indices into engine.ACTIONS.
+    """
+
+    def __init__(self, n_blocks_in_queue=3, features=False):
+        self.n_blocks_in_queue = n_blocks_in_queue
+        self.board = np.zeros((N_ROWS, N_COLS), dtype=np.uint8)
+        self.pieces = np.full(n_blocks_in_queue + 1, -1, dtype=np.int8)
+        self.obs = {"board": self.board, "pieces": self.pieces}
+        self.features = None
+        if features:
+            self.features = np.zeros(2 * N_COLS + 1, dtype=np.int32)
+            self.heights = self.features[:N_COLS]
+            self.holes = self.features[N_COLS:2 * N_COLS]
+            self.obs["features"] = self.features
+            self._features = BoardFeatures([0] * N_ROWS)
+        self.info = {"lines": 0, "pieces": 0}
+        self.game = None
+        self._rows = [0] * N_ROWS
+
+    def reset(self, seed=None):
+        """Start a new game and return the first observation."""
+        self.game = Game(self.n_blocks_in_queue, seed=seed)
+        self._rows = [0] * N_ROWS
+        self.board[:] = 0
+        if self.features is not None:
+            self.features[:] = 0
+        self._update_pieces()
+        self._update_info()
+        return self.obs
+
+    def step(self, action):
+        """Apply one action and one gravity step, return (obs, reward, done, info)."""
+        game = self.game
+        score = game.score
+        step = game.step(ACTIONS[action])
+
+        # The board only changes when a piece locks
+        if step.locked:
+            self._update_board()
+        self._update_pieces()
+        self._update_info()
+        return self.obs, game.score - score, step.game_over, self.info
+
+    def _update_board(self):
+        """Copy changed board rows into the buffer and refresh the features."""
+        for j, (old, new) in enumerate(zip(self._rows, self.game.board)):
+            if old != new:
+                self.board[j] = ROW_CELLS[new]
+        self._rows[:] = self.game.board
+        if self.features is None:
+            return
+
+        features = self._features
+        features.board[:] = self.game.board
+        features.reset()
+        self.heights[:] = features.heights
+        # Column masks carry a floor bit below the board
+        for i, column in enumerate(self.game.columns):
+            self.holes[i] = features.heights[i] - (column.bit_count() - 1)
+        self.features[-1] = features.bumpiness
+
+    def _update_pieces(self):
+        """Write active, queued and held piece kinds."""
+        for k, piece in enumerate(self.game.queue):
+            self.pieces[k] = piece.kind
+        held = self.game.held_piece
+        self.pieces[-1] = -1 if held is None else held.kind
+
+    def _update_info(self):
+        """Refresh the reused info dict."""
+        self.info["lines"] = self.game.lines
+        self.info["pieces"] = self.game.n_pieces
@@ -0,0 +1,154 @@
+"""Board features for AI heuristics, kept up to date as placements are applied and undone."""
+from engine import N_ROWS, N_COLS, FULL_ROW, pack_board, clear_packed_row
+from pieces import SHAPES, ROW_MASKS
+
+
+def _row_transitions(mask):
+    """Filled/empty changes along a row, counting both walls as filled."""
+    walled = mask << 1 | 1 | 1 << (N_COLS + 1)
+    return ((walled ^ walled >> 1) & ((1 << (N_COLS + 1)) - 1)).bit_count()
+
+
+ROW_TRANSITIONS = tuple(_row_transitions(mask) for mask in range(1 << N_COLS))
+# Top cell of every column a piece covers: (column offset, row offset)
+COLUMN_TOPS = tuple(
+    tuple(tuple((i, min(cj for ci, cj in shape if ci == i)) for i in sorted({ci for ci, _ in shape}))
+          for shape in shapes)
+    for shapes in SHAPES
+)
+
+
+def _bumpiness(heights):
+    """Sum of height differences between neighbouring columns."""
+    return sum(abs(heights[i] - heights[i + 1]) for i in range(N_COLS - 1))
+
+
+class BoardFeatures:
+    """Column heights, holes, row transitions, wells and bumpiness of a board.
+
+    apply() locks a piece on the board (a list of row masks, changed in
+    place) and clears lines, updating the features from the rows and columns
+    that changed only. undo() reverts the last apply(), so a search can score
+    every candidate placement on one board without copying it. Holes and
+    wells are derived from the tracked heights when read, and `key` is the
+    board packed into an int (see engine.pack_board) for hashing.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self._history = []
+        self.reset()
+
+    def reset(self):
+        """Compute every feature from scratch, forgetting undo history."""
+        heights = [0] * N_COLS
+        seen = 0
+        for j, row in enumerate(self.board):
+            new = row & ~seen
+            if new:
+                for i in range(N_COLS):
+                    if (new >> i) & 1:
+                        heights[i] = N_ROWS - j
+                seen |= new
+        self.heights = heights
+        self.aggregate_height = sum(heights)
+        self.n_cells = sum(row.bit_count() for row in self.board)
+        self.transitions = sum(ROW_TRANSITIONS[row] for row in self.board)
+        self.bumpiness = _bumpiness(heights)
+        self.key = pack_board(self.board)
+        self._history.clear()
+
+    @property
+    def holes(self):
+        """Empty cells below the top of their column."""
+        return self.aggregate_height - self.n_cells
+
+    @property
+    def wells(self):
+        """Sum of well depths: how far each column is below its lower neighbour (or wall)."""
+        heights = self.heights
+        total = 0
+        for i in range(N_COLS):
+            left = heights[i - 1] if i > 0 else N_ROWS
+            right = heights[i + 1] if i < N_COLS - 1 else N_ROWS
+            if heights[i] < left and heights[i] < right:
+                total += min(left, right) - heights[i]
+        return total
+
+    def apply(self, kind, orientation, x, y):
+        """Lock a piece at offset (x, y), clear lines and return the number of lines cleared."""
+        board, heights = self.board, self.heights
+        left, width, rows = ROW_MASKS[kind][orientation]
+        shift = x + left
+        old_rows = []
+        transitions, key = self.transitions, self.key
+        full = False
+        for dy, mask in rows:
+            j = y + dy
+            old = board[j]
+            new = old | mask << shift
+            board[j] = new
+            old_rows.append((j, old))
+            transitions += ROW_TRANSITIONS[new] - ROW_TRANSITIONS[old]
+            key |= mask << (shift + N_COLS * j)
+            full |= new == FULL_ROW
+        self._history.append((list(heights), self.aggregate_height, self.n_cells, self.transitions,
+                              self.bumpiness, self.key, old_rows, list(board) if full else None))
+        self.transitions, self.key = transitions, key
+        self.n_cells += 4
+
+        aggregate = self.aggregate_height
+        for i, top in COLUMN_TOPS[kind][orientation]:
+            height = N_ROWS - y - top
+            if height > heights[x + i]:
+                aggregate += height - heights[x + i]
+                heights[x + i] = height
+        self.aggregate_height = aggregate
+        if not full:
+            # Only the differences next to the piece's columns change
+            previous = self._history[-1][0]
+            bumpiness = self.bumpiness
+            for i in range(max(shift - 1, 0), min(shift + width, N_COLS - 1)):
+                bumpiness += (abs(heights[i] - heights[i + 1])
+                              - abs(previous[i] - previous[i + 1]))
+            self.bumpiness = bumpiness
+            return 0
+
+        # Rows go from the top down, so clearing one doesn't move the next
+        for j, _ in old_rows:
+            if board[j] == FULL_ROW:
+                self.key = clear_packed_row(self.key, j)
+        kept = [row for row in board if row != FULL_ROW]
+        n_cleared = N_ROWS - len(kept)
+        placed = self._history[-1][-1]
+        board[:] = [0] * n_cleared + kept
+        self.n_cells -= n_cleared * N_COLS
+        # Full rows have no transitions, empty rows have the two at the walls
+        self.transitions += 2 * n_cleared
+        for i in range(N_COLS):
+            top = N_ROWS - heights[i]
+            height = heights[i] - n_cleared
+            if placed[top] == FULL_ROW:
+                # The top cell was cleared, look for the next one down
+                while height and not (board[N_ROWS - height] >> i) & 1:
+                    height -= 1
+            heights[i] = height
+        self.aggregate_height = sum(heights)
+        self.bumpiness = _bumpiness(heights)
+        return n_cleared
+
+    def undo(self):
+        """Revert the last apply()."""
+        (self.heights, self.aggregate_height, self.n_cells, self.transitions,
+         self.bumpiness, self.key, old_rows, placed) = self._history.pop()
+        board = self.board
+        if placed is not None:
+            board[:] = placed
+        for j, old in old_rows:
+            board[j] = old
+
+    def evaluate(self, lines, weights):
+        """Weighted sum of (aggregate height, lines, holes, bumpiness), the search heuristic."""
+        w_height, w_lines, w_holes, w_bumpiness = weights
+        return (w_height * self.aggregate_height + w_lines * lines
+                + w_holes * self.holes + w_bumpiness * self.bumpiness)
@@ -1,150 +1,240 @@
+import argparse
+import json
+import socket
 import pygame
 from pygame.locals import KEYDOWN, K_ESCAPE, QUIT, K_w, K_a, K_SPACE, K_d, K_s, K_LSHIFT, K_q
+from pygame.locals import K_F1, K_F2, K_F3
 # Project imports
-from utils import Timer
+from utils import Timer, FixedTimestep
 from screen import Screen
-from blocks import BlockManager
-
-
-def run_game_loop(score, mngr, screen, timer, borders, surf):
-    """Run one game loop logic."""
-    state = "RUNNING"
+from engine import Game
+from render import Renderer
+from profiling import FrameProfiler
+from replay import Replay
+
+
+# Frames in a row that may skip rendering while the logic catches up
+MAX_FRAME_SKIP = 4
+KEY_ACTIONS = {
+    K_LSHIFT: "hold",
+    K_SPACE: "hard",
+    K_w: "clockwise",
+    K_q: "counterclockwise",
+    K_a: "left",
+    K_d: "right",
+}
+
+
+def run_game_loop(game, screen, timer, profiler=None, events=None):
+    """Run one game loop logic step over events (polled now by default).
+
+    Key presses are turned into the actions of one Game.step, and a held
+    key's repeat into another, with gravity when the timer says it is due.
+    Profiler keys: F1 toggles phase timings and their overlay, F2 dumps them
+    to frames.json and frames.csv, F3 captures a cProfile of 300 frames.
+    """
+    if profiler is None:
+        profiler = FrameProfiler()
+    if events is None:
+        events = pygame.event.get()
     # Check for key presses
-    for event in pygame.event.get():
-        if event.type == QUIT:
-            state = "SCORESCREEN"
-            continue
+    actions = []
+    for event in events:
+        if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+            return "SCORESCREEN", game, screen, timer
         elif event.type != KEYDOWN:
             continue
 
-        if event.key == K_ESCAPE:
-            state = "SCORESCREEN"
-            continue
-        elif event.key == K_LSHIFT:
-            if mngr.can_hold and not (mngr.held_piece is not None\
-                    and mngr.held_piece.block_type == mngr.active_piece.block_type):
-                mngr.hold_piece(screen)
-        elif event.key == K_SPACE:
+        if event.key in KEY_ACTIONS:
+            actions.append(KEY_ACTIONS[event.key])
+        elif event.key == K_F1:
+            profiler.toggle()
+        elif event.key == K_F2:
+            profiler.dump_json("frames.json")
+            profiler.dump_csv("frames.csv")
+        elif event.key == K_F3:
+            profiler.capture(300)
+
+        if event.key == K_SPACE:
             timer.set_on()
-            while mngr.active_piece.move(screen, "down"):
-                pass
-        elif event.key == K_w:
-            mngr.active_piece.rotate(screen, "w")
-        elif event.key == K_q:
-            mngr.active_piece.rotate(screen, "e")
-        elif event.key == K_a:
-            mngr.active_piece.move(screen, "left")
-        elif event.key == K_d:
-            mngr.active_piece.move(screen, "right")
-
-        if event.key in [K_w, K_a, K_d]:
+        elif event.key in [K_w, K_a, K_d]:
             timer.delta()
+    profiler.lap("events")
 
     # Check for continuous movement
     keys = pygame.key.get_pressed()
+    repeat = None
     if (keys[K_a] and keys[K_d]) or not timer.can_soft_move:
         pass
-
     elif keys[K_a]:
-        if mngr.active_piece.move(screen, "left"):
-            timer.delta()
-
+        repeat = "left"
     elif keys[K_d]:
-        if mngr.active_piece.move(screen, "right"):
-            timer.delta()
-
+        repeat = "right"
     elif keys[K_s]:
-        if mngr.active_piece.move(screen, "down"):
-            timer.delta()
+        repeat = "down"
+    profiler.lap("input_repeat")
 
     # Natural move down
-    if state == "RUNNING":
-        if timer.can_move_down:
-            has_moved_down = mngr.active_piece.move(screen, "down")
-            if not has_moved_down:
-                if any([block.j <= 0 for block in mngr.active_piece.blocks]):
-                    return "SCORESCREEN", score, mngr, screen, timer
-                mngr.remove_active(screen)
-
-                # Check for line clear
-                indices_to_clear, to_remove = [], []
-                for j, line in enumerate(screen.checksum):
-                    if line.checksum != 1023:
-                        continue
-
-                    indices_to_clear.append(j)
-                    for block in mngr.inactive_blocks:
-                        if block.j == j:
-                            to_remove.append(block)
-
-                # Update score
-                score_table = {0: 0, 1: 40, 2: 100, 3: 300, 4: 1200}
-                score += score_table[len(indices_to_clear)]
-
-                # Clear lines
-                for block in to_remove:
-                    screen.checksum[block.j][block.i] = 0
-                    mngr.inactive_blocks.remove(block)
-
-                # Update blocks above cleared lines
-                for j in indices_to_clear:
-                    blocks_to_move = [block for block in mngr.inactive_blocks if block.j < j]
-                    for block in blocks_to_move:
-                        screen.checksum[block.j][block.i] = 0
-
-                    for block in blocks_to_move:
-                        block.move("down")
-                        block.update(screen, update_grid=True)
-
-                mngr.spawn_new_piece(screen)
-
-            timer.update()
-
-        mngr.active_blocks.update(screen)
-        surf.fill((0, 0, 0))
-        for group in borders, mngr.active_blocks, mngr.inactive_blocks:
-            group.draw(surf)
-        screen.draw_queue(surf, mngr.queue)
-        screen.draw_held(surf, mngr.held_piece)
-
-    return state, score, mngr, screen, timer
-
-
-def run(tickrate=30, n_blocks_in_queue=3):
+    gravity = timer.can_move_down
+    if repeat is None:
+        step = game.step(actions, gravity)
+    else:
+        # Key presses go first on their own, so the repeat delay only restarts when the
+        # repeat itself moves the piece; a hard drop ends the tick before it
+        step = game.step(actions, gravity=False)
+        if not step.locked and not step.game_over:
+            step = game.step(repeat, gravity)
+            if step.moved:
+                timer.delta()
+    profiler.lap("line_clear" if step.lines_cleared else "gravity")
+    if step.game_over:
+        return "SCORESCREEN", game, screen, timer
+    if gravity:
+        timer.update()
+
+    return "RUNNING", game, screen, timer
+
+
+def run(tickrate=60, n_blocks_in_queue=3, profile=False, fps=60, render=True):
+    """Play a game with logic at tickrate steps/s, drawn at up to fps frames/s.
+
+    The logic runs on a fixed timestep, so slow frames don't slow the game
+    down; rendering is skipped for a few frames when the logic falls behind.
+    Inputs polled in a frame are applied on the next step, the first of that
+    frame if any is due. fps=None renders uncapped, render=False opens no
+    window and never draws, and tickrate=None runs the logic as fast as
+    possible.
+    """
     # Define game variables
     clock = pygame.time.Clock()
     timer = Timer(interval=200, delta=150, soft_delay=100)
-    score = 0
+    profiler = FrameProfiler(enabled=profile)
+    loop = FixedTimestep(1000 / (tickrate or 60), realtime=tickrate is not None)
 
     # Process
-    screen = Screen(400, epsilon=0.05, left_space=4, right_space=4)
-    borders, surf = screen.setup_screen()
-    surf.fill((0, 0, 0))
-    borders.update(screen)
-    borders.draw(surf)
-
-    # Init blocks and screen
-    mngr = BlockManager(screen, surf, n_blocks_in_queue)
-    pygame.display.flip()
+    screen = renderer = None
+    if render:
+        screen = Screen(400, epsilon=0.05, left_space=4, right_space=4)
+        borders, surf = screen.setup_screen()
+        renderer = Renderer(screen, borders, surf, profiler)
+
+    # Init game and screen
+    game = Game(n_blocks_in_queue)
+    if render:
+        renderer.draw(game)
     state = "RUNNING"
+    inputs = []
+    skipped = 0
 
     # Game loop
-    while True:
-        if state == "RUNNING":
-            state, score, mngr, screen, timer = run_game_loop(
-                score, mngr, screen, timer, borders, surf)
-            # Print score
-            screen.set_score(score)
-            screen.draw_score(surf)
-        else:
-            # TODO: Score screen
-            return
+    while state == "RUNNING":
+        profiler.start_frame()
+        n_steps = loop.advance()
+        inputs.extend(pygame.event.get())
+
+        for _ in range(n_steps):
+            timer.tick(loop.step())
+            state, game, screen, timer = run_game_loop(game, screen, timer, profiler, inputs)
+            inputs = []
+            if state != "RUNNING":
+                # TODO: Score screen
+                return
+
+        if render and n_steps:
+            if n_steps > 1 and skipped < MAX_FRAME_SKIP:
+                skipped += 1
+            else:
+                # Only push the parts of the frame that changed
+                renderer.draw(game)
+                skipped = 0
+
+        if fps and render:
+            clock.tick(fps)
+        elif loop.realtime and not n_steps:
+            # Nothing to draw or simulate yet, wait for the next step
+            pygame.time.wait(int(loop.step_ms - loop.accumulator))
+        profiler.lap("idle")
+        profiler.end_frame()
+
+
+def run_versus(host="127.0.0.1", port=None, fps=60):
+    """Play a match on a versus.py server, which runs both games and their gravity.
+
+    Key presses are sent to the server as actions, and the state it sends
+    back is drawn. The opponent's score, lines and incoming garbage are
+    shown in the window title. Return the result message, or None if the
+    window was closed or the connection lost.
+    """
+    from versus import PORT, encode, apply_state
+    connection = socket.create_connection((host, PORT if port is None else port))
+    connection.sendall(encode({"name": "human"}))
+    buffer = b""
+    while b"\n" not in buffer:
+        data = connection.recv(4096)
+        if not data:
+            return None
+        buffer += data
+    line, buffer = buffer.split(b"\n", 1)
+    start = json.loads(line)["start"]
+    connection.setblocking(False)
 
-        pygame.display.flip()
-        clock.tick(tickrate)
+    clock = pygame.time.Clock()
+    screen = Screen(400, epsilon=0.05, left_space=4, right_space=4)
+    borders, surf = screen.setup_screen()
+    renderer = Renderer(screen, borders, surf)
+    game = Replay(start["seed"], start["mode"], start["queue"]).new_game()
+    state, opponent = {}, {}
+    pygame.display.set_caption(f"versus {start['opponent']}")
+    renderer.draw(game)
+
+    try:
+        while True:
+            actions = []
+            for event in pygame.event.get():
+                if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+                    return None
+                if event.type == KEYDOWN and event.key in KEY_ACTIONS:
+                    actions.append(KEY_ACTIONS[event.key])
+            if actions:
+                connection.sendall(encode({"actions": actions}))
+
+            try:
+                data = connection.recv(1 << 16)
+                if not data:
+                    return None
+                buffer += data
+            except BlockingIOError:
+                pass
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                message = json.loads(line)
+                if "result" in message:
+                    print(f"{message['result']}: {message['score']} points, "
+                          f"{message['lines']} lines")
+                    return message
+                if "you" in message:
+                    state.update(message["you"])
+                    apply_state(game, state, message["you"])
+                    renderer.draw(game)
+                if "opponent" in message:
+                    opponent.update(message["opponent"])
+                    pygame.display.set_caption(
+                        f"versus {start['opponent']}: {opponent['score']} points, "
+                        f"{opponent['lines']} lines, {opponent['incoming']} incoming")
+            clock.tick(fps)
+    finally:
+        connection.close()
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play tetris.")
+    parser.add_argument("--connect", metavar="HOST:PORT",
+                        help="play a versus match on a versus.py server")
+    args = parser.parse_args()
     pygame.init()
-    run()
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        run_versus(host or "127.0.0.1", int(port) if port else None)
+    else:
+        run()
     pygame.quit()
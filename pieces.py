@@ -0,0 +1,164 @@
+"""Static tetromino data shared by the engine and the renderer."""
+
+COLOUR_TABLE = {
+    "O": (255, 255, 0),
+    "I": (0, 255, 255),
+    "S": (0, 255, 0),
+    "Z": (255, 0, 0),
+    "J": (0, 0, 255),
+    "T": (128, 0, 128),
+    "L": (255, 127, 0),
+}
+COORD_TABLE = {
+    "O": ((4, 5, 4, 5), (0, 0, 1, 1)),
+    "I": ((3, 4, 5, 6), (0, 0, 0, 0)),
+    "S": ((3, 4, 4, 5), (0, 0, -1, -1)),
+    "Z": ((3, 4, 4, 5), (-1, -1, 0, 0)),
+    "J": ((3, 3, 4, 5), (-1, 0, 0, 0)),
+    "T": ((3, 4, 5, 4), (0, 0, 0, -1)),
+    "L": ((5, 5, 4, 3), (-1, 0, 0, 0)),
+}
+CLOCKWISE_ROTATION_TABLE = {
+    "I":
+    {
+        "N": ((2, 1, 0, -1), (-1, 0, 1, 2)),
+        "E": ((1, 0, -1, -2), (2, 1, 0, -1)),
+        "S": ((-2, -1, 0, 1), (1, 0, -1, -2)),
+        "W": ((-1, 0, 1, 2), (-2, -1, 0, 1))
+    },
+    "L":
+    {
+        "E": ((-2, -1, 0, 1), (0, -1, 0, 1)),
+        "S": ((0, 1, 0, -1), (-2, -1, 0, 1)),
+        "W": ((2, 1, 0, -1), (0, 1, 0, -1)),
+        "N": ((0, -1, 0, 1), (2, 1, 0, -1))
+    },
+    "J":
+    {
+        "W": ((0, -1, 0, 1), (-2, -1, 0, 1)),
+        "N": ((2, 1, 0, -1), (0, -1, 0, 1)),
+        "E": ((0, 1, 0, -1), (2, 1, 0, -1)),
+        "S": ((-2, -1, 0, 1), (0, 1, 0, -1))
+    },
+    "S":
+    {
+        "N": ((1, 0, 1, 0), (-1, 0, 1, 2)),
+        "E": ((1, 0, -1, -2), (1, 0, 1, 0)),
+        "S": ((-1, 0, -1, 0), (1, 0, -1, -2)),
+        "W": ((-1, 0, 1, 2), (-1, 0, -1, 0))
+    },
+    "Z":
+    {
+        "N": ((2, 1, 0, -1), (0, 1, 0, 1)),
+        "E": ((0, -1, 0, -1), (2, 1, 0, -1)),
+        "S": ((-2, -1, 0, 1), (0, -1, 0, -1)),
+        "W": ((0, 1, 0, 1), (-2, -1, 0, 1))
+    },
+    "T":
+    {
+        "N": ((1, 0, 0, 0), (1, 0, 0, 0)),
+        "E": ((0, 0, 0, -1), (0, 0, 0, 1)),
+        "S": ((0, 0, -1, 0), (0, 0, -1, 0)),
+        "W": ((-1, 0, 1, 1), (-1, 0, 1, -1))
+    }
+}
+KICK_TABLE = {
+    "I": {
+        "N-E": ((0, 0), (-2, 0), (1, 0), (-2, 1), (1, -2)),  # 0->R
+        "E-S": ((0, 0), (-1, 0), (2, 0), (-1, -2), (2, 1)),  # R->2
+        "S-W": ((0, 0), (2, 0), (-1, 0), (2, -1), (-1, 2)),  # 2->L
+        "W-N": ((0, 0), (1, 0), (-2, 0), (1, 2), (-2, 1)),  # L->0
+        "E-N": ((0, 0), (2, 0), (-1, 0), (2, -1), (-1, 2)),  # R->0
+        "S-E": ((0, 0), (1, 0), (-2, 0), (1, 2), (-2, -1)),  # 2->R
+        "W-S": ((0, 0), (-2, 0), (1, 0), (-2, 1), (1, -2)),  # L->2
+        "N-W": ((0, 0), (-1, 0), (2, 0), (-1, -2), (2, 1))  # 0->L
+    },
+    "else": {
+        "N-E": ((0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)),  # 0->R
+        "E-S": ((0, 0), (1, 0), (1, 1), (0, -2), (1, -2)),  # R->2
+        "S-W": ((0, 0), (1, 0), (1, 1), (0, 2), (1, 2)),  # 2->L
+        "W-N": ((0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)),  # L->0
+        "E-N": ((0, 0), (1, 0), (1, 1), (0, -2), (1, -2)),  # R->0
+        "S-E": ((0, 0), (-1, 0), (-1, -1), (0, 2), (-2, 2)),  # 2->R
+        "W-S": ((0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)),  # L->2
+        "N-W": ((0, 0), (1, 0), (1, -1), (0, 2), (1, 2))  # 0->L
+    }
+}
+
+SCORE_TABLE = {0: 0, 1: 40, 2: 100, 3: 300, 4: 1200}
+# Garbage lines sent to the opponent in versus mode, for the same clears as SCORE_TABLE
+GARBAGE_TABLE = {0: 0, 1: 0, 2: 1, 3: 2, 4: 4}
+GARBAGE_COLOUR = (128, 128, 128)
+
+
+# One-time piece catalogue, indexed by integers rather than strings:
+# block kind (position in BLOCK_TYPES), orientation (0-3 for N, E, S, W)
+# and rotation direction (CLOCKWISE or COUNTERCLOCKWISE).
+BLOCK_TYPES = tuple(COLOUR_TABLE)
+BLOCK_INDEX = {block_type: kind for kind, block_type in enumerate(BLOCK_TYPES)}
+ORIENTATIONS = ("N", "E", "S", "W")
+CLOCKWISE, COUNTERCLOCKWISE = 0, 1
+ROTATION_TARGETS = tuple(((o + 1) % 4, (o - 1) % 4) for o in range(4))
+COLOURS = tuple(COLOUR_TABLE[block_type] for block_type in BLOCK_TYPES)
+# Colours of locked cells: the piece kinds, then garbage
+CELL_COLOURS = COLOURS + (GARBAGE_COLOUR,)
+GARBAGE = len(COLOURS)
+
+
+def _build_shapes():
+    """Cell offsets of every (kind, orientation), relative to the spawn position."""
+    shapes = []
+    for block_type in BLOCK_TYPES:
+        cells = tuple(zip(*COORD_TABLE[block_type]))
+        orientations = []
+        for orientation in ORIENTATIONS:
+            orientations.append(cells)
+            if block_type == "O":
+                continue
+            dx, dy = CLOCKWISE_ROTATION_TABLE[block_type][orientation]
+            cells = tuple((i + dxi, j + dyi) for (i, j), dxi, dyi in zip(cells, dx, dy))
+        shapes.append(tuple(orientations))
+    return tuple(shapes)
+
+
+def _build_row_masks(shapes):
+    """Encode every shape as (leftmost column, width, ((row offset, bit mask), ...))."""
+    row_masks = []
+    for orientations in shapes:
+        masks = []
+        for cells in orientations:
+            left = min(i for i, _ in cells)
+            width = max(i for i, _ in cells) - left + 1
+            rows = {}
+            for i, j in cells:
+                rows[j] = rows.get(j, 0) | (1 << (i - left))
+            masks.append((left, width, tuple(sorted(rows.items()))))
+        row_masks.append(tuple(masks))
+    return tuple(row_masks)
+
+
+def _build_column_bottoms(shapes):
+    """Lowest cell of every column a shape covers, as ((column, row offset), ...)."""
+    return tuple(
+        tuple(tuple(sorted({i: max(cj for ci, cj in cells if ci == i) for i, _ in cells}.items()))
+              for cells in orientations)
+        for orientations in shapes)
+
+
+def _build_kicks():
+    """Kick offsets to try for every (kind, orientation, direction), empty for the O-piece."""
+    kicks = []
+    for block_type in BLOCK_TYPES:
+        table = KICK_TABLE["I" if block_type == "I" else "else"]
+        kicks.append(tuple(
+            tuple(() if block_type == "O" else
+                  table[f"{ORIENTATIONS[o]}-{ORIENTATIONS[target]}"]
+                  for target in ROTATION_TARGETS[o])
+            for o in range(4)))
+    return tuple(kicks)
+
+
+SHAPES = _build_shapes()
+ROW_MASKS = _build_row_masks(SHAPES)
+COLUMN_BOTTOMS = _build_column_bottoms(SHAPES)
+KICKS = _build_kicks()
@@ -0,0 +1,139 @@
+"""Opt-in per-phase frame timings and cProfile captures for the game loop."""
+import cProfile
+import csv
+import io
+import json
+import pstats
+import time
+from collections import deque
+
+# Phases of one frame, in the order main.run goes through them
+PHASES = ("events", "input_repeat", "gravity", "line_clear",
+          "sprites", "queue", "held", "score", "overlay", "display", "idle")
+
+
+def _noop(*args):
+    pass
+
+
+class FrameProfiler:
+    """Keep rolling timings of the phases of the last `window` frames.
+
+    The loop calls start_frame, then lap(phase) at the end of every phase,
+    then end_frame. While disabled these are replaced by no-ops on the
+    instance, so leaving the calls in the loop costs next to nothing.
+    A cProfile capture of the next frames can be started at any time.
+    """
+
+    def __init__(self, enabled=False, window=120, overlay=True):
+        self.window = window
+        self.overlay = overlay
+        self.frames = deque(maxlen=window)
+        self.n_frames = 0
+        self._frame = dict.fromkeys(PHASES, 0.0)
+        self._last = time.perf_counter()
+        self._profile = None
+        self._capture_left = 0
+        self.capture_path = None
+        self.enabled = enabled
+        self._sync()
+
+    def _sync(self):
+        """Swap the hot methods for no-ops when nothing needs them."""
+        for name in ("start_frame", "lap", "end_frame"):
+            self.__dict__.pop(name, None)
+        if not self.enabled:
+            self.start_frame = self.lap = _noop
+            if not self._capture_left:
+                self.end_frame = _noop
+
+    def toggle(self):
+        """Switch timings (and the overlay) on or off."""
+        self.enabled = not self.enabled
+        self._sync()
+        self.start_frame()
+
+    def start_frame(self):
+        """Start timing a new frame."""
+        self._frame = dict.fromkeys(PHASES, 0.0)
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        """Charge the time since the previous lap to phase."""
+        now = time.perf_counter()
+        self._frame[phase] += now - self._last
+        self._last = now
+
+    def end_frame(self):
+        """Store the frame and advance a running cProfile capture."""
+        if self.enabled:
+            self.frames.append(self._frame)
+            self.n_frames += 1
+            self._frame = dict.fromkeys(PHASES, 0.0)
+        if self._capture_left:
+            self._capture_left -= 1
+            if not self._capture_left:
+                self._finish_capture()
+
+    def capture(self, n_frames=300, path=None):
+        """Run cProfile over the next n_frames frames, then write the stats to path."""
+        if self._capture_left:
+            return
+        self.capture_path = path or time.strftime("frames-%Y%m%d-%H%M%S.prof")
+        self._capture_left = n_frames
+        self._profile = cProfile.Profile()
+        self._sync()
+        self._profile.enable()
+
+    def _finish_capture(self):
+        self._profile.disable()
+        self._profile.dump_stats(self.capture_path)
+        stream = io.StringIO()
+        pstats.Stats(self._profile, stream=stream).sort_stats("cumulative").print_stats(20)
+        print(stream.getvalue())
+        self._profile = None
+        self._sync()
+
+    def stats(self):
+        """Return {phase: (mean ms, max ms)} over the stored frames, plus "frame" totals."""
+        stats = {}
+        if not self.frames:
+            return stats
+        for phase in PHASES + ("frame",):
+            if phase == "frame":
+                times = [sum(frame.values()) for frame in self.frames]
+            else:
+                times = [frame[phase] for frame in self.frames]
+            stats[phase] = (sum(times) / len(times) * 1000, max(times) * 1000)
+        return stats
+
+    def overlay_lines(self):
+        """Text lines of the in-game overlay: mean and max ms of every phase."""
+        stats = self.stats()
+        if not stats:
+            return []
+        mean, _ = stats["frame"]
+        lines = [f"{1000 / mean if mean else 0:5.0f} fps"]
+        lines += [f"{phase[:10]:<10} {stats[phase][0]:5.2f} {stats[phase][1]:5.2f}"
+                  for phase in PHASES]
+        return lines
+
+    def dump_json(self, path):
+        """Write the phase statistics and the stored frames (in ms) as JSON."""
+        data = {
+            "phases": PHASES,
+            "stats": {phase: {"mean_ms": mean, "max_ms": peak}
+                      for phase, (mean, peak) in self.stats().items()},
+            "frames": [[frame[phase] * 1000 for phase in PHASES] for frame in self.frames],
+        }
+        with open(path, "w") as file:
+            json.dump(data, file, indent=2)
+
+    def dump_csv(self, path):
+        """Write one row of phase timings (in ms) per stored frame."""
+        first = self.n_frames - len(self.frames)
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(("frame",) + PHASES)
+            for k, frame in enumerate(self.frames):
+                writer.writerow([first + k] + [f"{frame[phase] * 1000:.4f}" for phase in PHASES])
@@ -0,0 +1,50 @@
+"""Seeded piece generators, owned by engine.Game."""
+import random
+from pieces import BLOCK_TYPES
+
+_BIASED_CHOICES = BLOCK_TYPES + ("random",)
+
+
+class SNESGenerator:
+    """Random pieces with SNES-bias against getting same twice in a row."""
+
+    mode = "snes"
+
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.previous = None
+
+    def next(self):
+        """Return the block type of the next piece."""
+        block_type = self.rng.choice(_BIASED_CHOICES)
+        if block_type == "random" or block_type == self.previous:
+            block_type = self.rng.choice(BLOCK_TYPES)
+        self.previous = block_type
+        return block_type
+
+
+class BagGenerator:
+    """7-bag: deal all seven pieces in a shuffled order, then refill the bag."""
+
+    mode = "bag"
+
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.bag = []
+
+    def next(self):
+        """Return the block type of the next piece."""
+        if not self.bag:
+            self.bag = list(BLOCK_TYPES)
+            self.rng.shuffle(self.bag)
+        return self.bag.pop()
+
+
+GENERATORS = {generator.mode: generator for generator in (SNESGenerator, BagGenerator)}
+
+
+def make_generator(mode="snes", seed=None):
+    """Create a piece generator by mode name."""
+    return GENERATORS[mode](seed)
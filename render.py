@@ -0,0 +1,139 @@
+"""Dirty-rectangle rendering: only redraw what changed since the last frame."""
+import pygame
+from blocks import block_surface
+from profiling import FrameProfiler
+
+# Frames between two refreshes of the profiler overlay
+OVERLAY_REFRESH = 10
+
+
+class Renderer:
+    """Draw a game to the display, pushing only the rects that changed.
+
+    Borders and the score box are drawn once onto a static background. Each
+    frame compares the colour of every board cell with the previous frame;
+    changed cells are restored from the background or refilled. Queue and
+    hold slots are re-blitted from cached piece previews when their piece
+    changes. Only the touched rects go to pygame.display.update.
+    Drawing phases are timed by profiler, which also feeds the overlay.
+    """
+
+    def __init__(self, screen, borders, surf, profiler=None):
+        self.screen = screen
+        self.surf = surf
+        self.background = pygame.Surface(surf.get_size())
+        self.background.fill((0, 0, 0))
+        borders.update(screen)
+        borders.draw(self.background)
+        self.block_size = int(screen.scale // 10 * (1 - screen.epsilon))
+        self.cells = {}
+        self.queue_kinds = []
+        self.held_kind = None
+        self.score = None
+        self.score_rect = None
+        self.full_redraw = True
+        self.profiler = FrameProfiler() if profiler is None else profiler
+        self.overlay_rect = None
+        self._overlay_font = None
+
+    def cell_rect(self, i, j):
+        """Screen rect of grid cell (i, j)."""
+        x_coord, y_coord = self.screen.get_coords(i, j)
+        return pygame.Rect(round(x_coord), round(y_coord), self.block_size, self.block_size)
+
+    def draw(self, game):
+        """Draw the current state of game and return the list of updated rects."""
+        screen, surf, profiler = self.screen, self.surf, self.profiler
+        cells = {}
+        for i, j, colour in screen.game_cells(game):
+            cells[i, j] = colour
+
+        if self.full_redraw:
+            surf.blit(self.background, (0, 0))
+            changed = list(cells)
+        else:
+            previous = self.cells
+            changed = [key for key in cells.keys() | previous.keys()
+                       if cells.get(key) != previous.get(key)]
+        dirty = []
+        for key in changed:
+            rect = self.cell_rect(*key)
+            colour = cells.get(key)
+            if colour is None:
+                surf.blit(self.background, rect, rect)
+            else:
+                surf.blit(block_surface(self.screen, colour), rect)
+            dirty.append(rect)
+        self.cells = cells
+        profiler.lap("sprites")
+
+        # Previews: one blit per queue or hold slot whose piece changed
+        if len(self.queue_kinds) != len(game.queue) - 1:
+            self.queue_kinds = [None] * (len(game.queue) - 1)
+        for k in range(len(self.queue_kinds)):
+            kind = game.queue[k + 1].kind
+            if self.full_redraw or self.queue_kinds[k] != kind:
+                self.draw_preview(kind, screen.queue_origin(k), dirty)
+                self.queue_kinds[k] = kind
+        profiler.lap("queue")
+        held_kind = None if game.held_piece is None else game.held_piece.kind
+        if self.full_redraw or held_kind != self.held_kind:
+            self.draw_preview(held_kind, screen.held_origin(), dirty)
+            self.held_kind = held_kind
+        profiler.lap("held")
+
+        if game.score != self.score or self.full_redraw:
+            if self.score_rect is not None:
+                surf.blit(self.background, self.score_rect, self.score_rect)
+                dirty.append(self.score_rect)
+            screen.set_score(game.score)
+            self.score_rect = screen.draw_score(surf)
+            self.score = game.score
+            dirty.append(self.score_rect)
+        profiler.lap("score")
+
+        self.draw_overlay(dirty)
+        profiler.lap("overlay")
+
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        elif dirty:
+            pygame.display.update(dirty)
+        profiler.lap("display")
+        return dirty
+
+    def draw_preview(self, kind, origin, dirty):
+        """Replace the preview slot at grid cell origin with a piece of this kind (or nothing)."""
+        rect = self.screen.preview_rect(*origin)
+        self.surf.blit(self.background, rect, rect)
+        if kind is not None:
+            self.surf.blit(self.screen.piece_preview(kind), rect)
+        dirty.append(rect)
+
+    def draw_overlay(self, dirty):
+        """Show the profiler's phase timings in the left margin, or clear them."""
+        profiler = self.profiler
+        visible = profiler.enabled and profiler.overlay
+        if visible:
+            if self.overlay_rect is not None and profiler.n_frames % OVERLAY_REFRESH:
+                return
+        elif self.overlay_rect is None:
+            return
+        if self.overlay_rect is not None:
+            self.surf.blit(self.background, self.overlay_rect, self.overlay_rect)
+            dirty.append(self.overlay_rect)
+            self.overlay_rect = None
+        lines = profiler.overlay_lines() if visible else []
+        if not lines:
+            return
+
+        if self._overlay_font is None:
+            self._overlay_font = pygame.font.Font(None, 16)
+        font = self._overlay_font
+        height = font.get_linesize()
+        overlay = pygame.Surface((self.screen.scale / 10 * self.screen.left, height * len(lines)))
+        for k, line in enumerate(lines):
+            overlay.blit(font.render(line, True, (255, 255, 255)), (2, k * height))
+        self.overlay_rect = self.surf.blit(overlay, self.screen.corner(-self.screen.left - 1, 11))
+        dirty.append(self.overlay_rect)
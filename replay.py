@@ -0,0 +1,82 @@
+"""Compact game replays: generator seed plus one packed action per tick."""
+import struct
+from engine import Game, ACTIONS
+from randomizer import GENERATORS, make_generator
+
+MAGIC = b"TRPL"
+VERSION = 1
+MODES = tuple(GENERATORS)
+# magic, version, generator mode, queue length, seed, number of ticks
+HEADER = struct.Struct("<4sBBBQI")
+NO_ACTION = len(ACTIONS)
+ACTION_INDEX = {action: k for k, action in enumerate(ACTIONS)}
+
+
+class Replay:
+    """Record the actions of a seeded game and re-simulate it headlessly.
+
+    Each tick is one call to Game.step, so one action (or None) followed by
+    a gravity step. Actions are stored as 4-bit codes, two ticks per byte.
+    """
+
+    def __init__(self, seed, mode="snes", n_blocks_in_queue=3, actions=None):
+        self.seed = seed
+        self.mode = mode
+        self.n_blocks_in_queue = n_blocks_in_queue
+        self.actions = bytearray() if actions is None else bytearray(actions)
+
+    def new_game(self):
+        """Create the game this replay starts from."""
+        return Game(self.n_blocks_in_queue, generator=make_generator(self.mode, self.seed))
+
+    def record(self, action):
+        """Append the action of one tick (one of ACTIONS, or None)."""
+        self.actions.append(NO_ACTION if action is None else ACTION_INDEX[action])
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __iter__(self):
+        """Yield the action of every tick."""
+        for code in self.actions:
+            yield None if code == NO_ACTION else ACTIONS[code]
+
+    def simulate(self, game=None):
+        """Play every recorded tick on a fresh game (or on game) and return it."""
+        game = self.new_game() if game is None else game
+        for action in self:
+            if game.game_over:
+                break
+            game.step(action)
+        return game
+
+    def to_bytes(self):
+        """Pack the replay into its binary format."""
+        codes = self.actions + bytes(len(self.actions) % 2)
+        packed = bytes(codes[k] | codes[k + 1] << 4 for k in range(0, len(codes), 2))
+        header = HEADER.pack(MAGIC, VERSION, MODES.index(self.mode), self.n_blocks_in_queue,
+                             self.seed, len(self.actions))
+        return header + packed
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Unpack a replay written by to_bytes."""
+        magic, version, mode, n_blocks_in_queue, seed, n_ticks = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a tetris replay, or an unsupported version.")
+        actions = bytearray()
+        for byte in data[HEADER.size:]:
+            actions.append(byte & 0xF)
+            actions.append(byte >> 4)
+        return cls(seed, MODES[mode], n_blocks_in_queue, actions[:n_ticks])
+
+    def save(self, path):
+        """Write the replay to a file."""
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        """Read a replay from a file."""
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
@@ -1,5 +1,10 @@
 import pygame
-from blocks import Bit10, Block, Tetris
+from blocks import Block, block_surface
+from pieces import COLOURS, CELL_COLOURS, SHAPES
+from engine import N_COLS
+
+# Brightness of the ghost piece relative to the active piece
+GHOST_SHADE = 0.3
 
 
 class Screen:
@@ -10,9 +15,19 @@ class Screen:
         self.epsilon = epsilon
         self.left = left_space
         self.right = right_space
-        self.checksum = [Bit10() for _ in range(20)]
         self.score = 0
-        self.font = pygame.font.SysFont(font, ft)
+        self._previews = {}
+        self._font_spec = (font, ft)
+        self._font = None
+
+    @property
+    def font(self):
+        """Score font, loaded on first use; the default font skips the system font scan."""
+        if self._font is None:
+            name, size = self._font_spec
+            self._font = pygame.font.Font(None, size) if name is None else \
+                pygame.font.SysFont(name, size)
+        return self._font
 
     def setup_screen(self):
         """Create tetris-ready screen based on scaling factor."""
@@ -61,40 +76,83 @@ class Screen:
         self.score = score
 
     def draw_score(self, screen, delta=0.1):
-        """Draw score as text."""
+        """Draw score as text, return the drawn rect."""
         score_text = self.font.render(str(self.score), True, (0, 0, 0))
-        screen.blit(score_text, (self.scale/10*(self.left + 12 + 2*delta),
-                                 self.scale/10*(3 + 2*delta)))
+        return screen.blit(score_text, (self.scale/10*(self.left + 12 + 2*delta),
+                                        self.scale/10*(3 + 2*delta)))
+
+    def game_cells(self, game):
+        """List (i, j, colour) of the ghost piece, the active piece and every locked cell.
+
+        The ghost piece shows where a hard drop would land, in a darker colour.
+        Later cells cover earlier ones, so the active piece hides its ghost.
+        """
+        piece = game.active_piece
+        distance = game.drop_distance()
+        ghost = tuple(int(c * GHOST_SHADE) for c in piece.colour)
+        cells = [(i, j + distance, ghost) for i, j in piece.cells if distance]
+        cells += [(i, j, piece.colour) for i, j in piece.cells]
+        for k, kind in enumerate(game.cells):
+            if kind:
+                cells.append((k % N_COLS, k // N_COLS, CELL_COLOURS[kind - 1]))
+        return cells
+
+    def corner(self, i, j):
+        """Screen coords of the top left corner of grid cell (i, j)."""
+        return self.scale / 10 * (i + self.left + 1), self.scale / 10 * j
+
+    def queue_origin(self, k):
+        """Top left grid cell of the k-th queue preview, right of the board."""
+        # TODO: Add checks to avoid screen overflow OR scale everything!
+        return 11, 6 + k*3
+
+    def held_origin(self):
+        """Top left grid cell of the held piece preview, left of the board."""
+        return -self.left - 1, 6
+
+    def piece_preview(self, kind):
+        """Surface with a piece of this kind aligned to its top left corner, cached per scale."""
+        key = (kind, self.scale, self.epsilon)
+        preview = self._previews.get(key)
+        if preview is None:
+            block = self.scale / 10
+            block_width_in_pixel = self.scale // 10 * (1 - self.epsilon)
+            shape = SHAPES[kind][0]
+            left = min([ci for ci, _ in shape])
+            top = min([cj for _, cj in shape])
+            preview = pygame.Surface([4*block, 2*block])
+            preview.set_colorkey((0, 0, 0))
+            for ci, cj in shape:
+                preview.fill(COLOURS[kind], [block*(ci - left + self.epsilon/2),
+                                             block*(cj - top + self.epsilon/2),
+                                             block_width_in_pixel, block_width_in_pixel])
+            self._previews[key] = preview
+        return preview
+
+    def preview_rect(self, i, j):
+        """Screen rect covered by a piece preview with top left grid cell (i, j)."""
+        return pygame.Rect(self.corner(i, j), self.piece_preview(0).get_size())
+
+    def draw_cells(self, surf, cells):
+        """Draw (i, j, colour) cells by blitting the shared block surfaces."""
+        blits = []
+        for i, j, colour in cells:
+            # Round like sprite rects do, blit alone would truncate
+            x_coord, y_coord = self.get_coords(i, j)
+            blits.append((block_surface(self, colour), (round(x_coord), round(y_coord))))
+        surf.blits(blits, doreturn=False)
+
+    def draw_game(self, surf, game):
+        """Draw the active piece and every locked cell of a game."""
+        self.draw_cells(surf, self.game_cells(game))
 
     def draw_queue(self, surf, queue):
         """Draw pieces in queue."""
-        # TODO: Add checks to avoid screen overflow OR scale everything!
-        draw_group = pygame.sprite.Group()
-        for i, piece in enumerate(queue[1:]):
-            draw_piece = Tetris(self, piece.block_type)
-            # Align using top left corner
-            left = min([block.i for block in draw_piece.blocks])
-            top = min([block.j for block in draw_piece.blocks])
-            for block in draw_piece.blocks:
-                block.i += 10 - left + 1
-                block.j += 6 - top + (i)*3
-                draw_group.add(block)
-        draw_group.update(self)
-        draw_group.draw(surf)
+        for k, piece in enumerate(queue[1:]):
+            surf.blit(self.piece_preview(piece.kind), self.corner(*self.queue_origin(k)))
 
     def draw_held(self, surf, piece):
         """Draw copy of held piece."""
         if piece is None:
             return
-        group = pygame.sprite.Group()
-        piece_copy = Tetris(self, piece.block_type)
-        # Align using top left corner
-        left = min([block.i for block in piece_copy.blocks])
-        top = min([block.j for block in piece_copy.blocks])
-        for block in piece_copy.blocks:
-            block.i -= left + self.left + 1
-            block.j += 6 - top
-            group.add(block)
-
-        group.update(self)
-        group.draw(surf)
+        surf.blit(self.piece_preview(piece.kind), self.corner(*self.held_origin()))
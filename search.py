@@ -0,0 +1,440 @@
+"""Placement search AI: enumerate every reachable landing spot and pick the best one."""
+import functools
+import heapq
+import json
+import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from engine import Game, fits, board_columns, drop_distance, N_ROWS, N_COLS, FULL_ROW
+from features import BoardFeatures
+from transposition import TranspositionTable
+from pieces import BLOCK_TYPES, SHAPES, ROW_MASKS, KICKS, ROTATION_TARGETS, CLOCKWISE, \
+    COUNTERCLOCKWISE
+
+# Heuristic weights for (aggregate height, cleared lines, holes, bumpiness)
+DEFAULT_WEIGHTS = (-0.510066, 0.760666, -0.35663, -0.184483)
+GAME_OVER = float("-inf")
+STEPS = (("left", -1, 0), ("right", 1, 0), ("down", 0, 1))
+TURNS = (("clockwise", CLOCKWISE), ("counterclockwise", COUNTERCLOCKWISE))
+# Finesse tables are indexed by x + FINESSE_OFFSET, and cached next to this module
+FINESSE_OFFSET = N_COLS
+FINESSE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "finesse.json")
+
+
+def place(board, kind, orientation, x, y):
+    """Return the board after locking a piece and clearing lines, and the number of lines."""
+    board = list(board)
+    left, _, rows = ROW_MASKS[kind][orientation]
+    for dy, mask in rows:
+        board[y + dy] |= mask << (x + left)
+    kept = [line for line in board if line != FULL_ROW]
+    n_cleared = N_ROWS - len(kept)
+    if n_cleared:
+        board = [0] * n_cleared + kept
+    return board, n_cleared
+
+
+def enumerate_placements(board, kind, start, deadline=None):
+    """Find every distinct landing position reachable from start = (x, y, orientation).
+
+    Transitions follow simple_ai.run_game_loop: one action, then one gravity
+    step which locks the piece if it can't move down. Return a dict mapping the
+    set of locked cells to (x, y, orientation, actions), keeping the shortest
+    action sequence for placements that cover the same cells.
+    """
+    placements = {}
+    columns = board_columns(board)
+    parents = {start: None}
+    frontier = deque([start])
+    start_fits = fits(board, kind, start[2], start[0], start[1])
+
+    def lock(state, path_state, action):
+        x, y, orientation = state
+        cells = frozenset((x + i, y + j) for i, j in SHAPES[kind][orientation])
+        if cells not in placements:
+            placements[cells] = (x, y, orientation, path_state, action)
+
+    def gravity(state, path_state, action):
+        x, y, orientation = state
+        if fits(board, kind, orientation, x, y + 1):
+            landed = (x, y + 1, orientation)
+            if landed not in parents:
+                parents[landed] = (path_state, action)
+                frontier.append(landed)
+        else:
+            lock(state, path_state, action)
+
+    expanded = 0
+    while frontier:
+        state = frontier.popleft()
+        x, y, orientation = state
+        expanded += 1
+        if deadline is not None and expanded % 64 == 0 and time.perf_counter() > deadline:
+            break
+
+        for action, dx, dy in STEPS:
+            if fits(board, kind, orientation, x + dx, y + dy):
+                gravity((x + dx, y + dy, orientation), state, action)
+            else:
+                gravity(state, state, action)
+        for action, turn in TURNS:
+            target = ROTATION_TARGETS[orientation][turn]
+            for kickx, kicky in KICKS[kind][orientation][turn]:
+                if fits(board, kind, target, x + kickx, y + kicky):
+                    gravity((x + kickx, y + kicky, target), state, action)
+                    break
+            else:
+                # A failed rotation still lets gravity apply, like a blocked move
+                gravity(state, state, action)
+        # Every state but a start in the stack fits, and that one locks in place
+        drop = 0
+        if state != start or start_fits:
+            drop = drop_distance(columns, kind, orientation, x, y)
+        lock((x, y + drop, orientation), state, "hard")
+
+    # Rebuild action sequences from parent pointers
+    result = {}
+    for cells, (x, y, orientation, state, action) in placements.items():
+        actions = [action]
+        while parents[state] is not None:
+            state, action = parents[state]
+            actions.append(action)
+        result[cells] = (x, y, orientation, actions[::-1])
+    return result
+
+
+def drop_placements(board, kind):
+    """Find landing positions reachable by rotating at spawn, shifting and dropping.
+
+    Cheaper than enumerate_placements and used for lookahead pieces, at the cost of
+    ignoring tucks and spins. Return a list of distinct (x, y, orientation).
+    """
+    placements, seen = [], set()
+    columns = board_columns(board)
+    for orientation in range(4):
+        # Orientations that are translations of each other give the same placements
+        left, width, rows = ROW_MASKS[kind][orientation]
+        if tuple(mask for _, mask in rows) in seen:
+            continue
+        seen.add(tuple(mask for _, mask in rows))
+        for x in range(-left, N_COLS - width - left + 1):
+            if fits(board, kind, orientation, x, 0):
+                placements.append((x, drop_distance(columns, kind, orientation, x, 0), orientation))
+    return placements
+
+
+class Probe(Game):
+    """A scratch Game that plays actions with Game.step and records where its piece lands.
+
+    The piece is never locked, so the board is left as it was given.
+    """
+
+    __slots__ = ("landed",)
+
+    def __init__(self):
+        super().__init__(n_blocks_in_queue=1)
+        self.landed = None
+
+    def land(self):
+        self.landed = frozenset(self.active_piece.cells)
+
+    def follow(self, board, columns, kind, start, actions):
+        """Play actions from start = (x, y, orientation) on board, one Game.step each.
+
+        columns are the board's board_columns. Return the cells the piece
+        lands on after the last action, or None if it lands earlier or not at all.
+        """
+        self.board, self.columns, self.landed = board, columns, None
+        piece = self.active_piece
+        if piece.kind != kind:
+            piece.respawn(BLOCK_TYPES[kind])
+        piece.x, piece.y, piece.orientation = start
+        for action in actions:
+            if self.landed is not None:
+                return None
+            self.step(action)
+        return self.landed
+
+
+def build_finesse_table():
+    """Shortest actions from spawn to every drop placement on an empty board.
+
+    Indexed [kind][orientation][x + FINESSE_OFFSET], None where the piece
+    doesn't fit. Orientations that are translations of each other share
+    their paths, since they cover the same cells.
+    """
+    board = [0] * N_ROWS
+    columns = board_columns(board)
+    table = []
+    for kind in range(len(SHAPES)):
+        placements = enumerate_placements(board, kind, (0, 0, 0))
+        paths = []
+        for orientation, cells in enumerate(SHAPES[kind]):
+            row = []
+            for x in range(-FINESSE_OFFSET, N_COLS):
+                if not fits(board, kind, orientation, x, 0):
+                    row.append(None)
+                    continue
+                y = drop_distance(columns, kind, orientation, x, 0)
+                found = placements.get(frozenset((x + i, y + j) for i, j in cells))
+                row.append(None if found is None else found[3])
+            paths.append(row)
+        table.append(paths)
+    return table
+
+
+def _rules_checksum():
+    """Checksum of the movement rules a finesse table was built for."""
+    return zlib.crc32(repr((SHAPES, KICKS, ROTATION_TARGETS, N_ROWS, N_COLS)).encode())
+
+
+@functools.lru_cache()
+def load_finesse_table(path=FINESSE_PATH):
+    """The finesse table cached at path, built and saved there if missing or out of date.
+
+    If path can't be written the table is only kept in memory.
+    """
+    try:
+        with open(path) as file:
+            data = json.load(file)
+        if data["rules"] == _rules_checksum():
+            return data["table"]
+    except (OSError, ValueError, KeyError):
+        pass
+    table = build_finesse_table()
+    try:
+        with open(path + ".tmp", "w") as file:
+            json.dump({"rules": _rules_checksum(), "table": table}, file)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+    return table
+
+
+# Drop placements that don't top out, per packed board and kind. Shared by
+# every search in this process, since the next decisions place pieces on
+# boards the previous lookahead already expanded.
+PLACEMENTS = TranspositionTable(10000)
+
+
+def cached_drop_placements(board, key, kind):
+    """drop_placements of kind on board (packed as key) that don't top out, through PLACEMENTS."""
+    table_key = key << 3 | kind
+    placements = PLACEMENTS.get(table_key)
+    if placements is None:
+        placements = [(x, y, orientation) for x, y, orientation in drop_placements(board, kind)
+                      if all(y + j > 0 for _, j in SHAPES[kind][orientation])]
+        PLACEMENTS.put(table_key, placements)
+    return placements
+
+
+class PlacementAI:
+    """Pick the best-scoring placement of the active (or held) piece and play it out.
+
+    Candidate boards are scored incrementally with BoardFeatures apply/undo,
+    and each decision stops enumerating once its time budget (seconds) is
+    used up. With finesse set, only drop placements are considered, played
+    with the paths of the finesse table, and placements are only searched
+    live when the stack blocks their path.
+    """
+
+    def __init__(self, weights=DEFAULT_WEIGHTS, use_hold=True, time_budget=0.05, finesse=False):
+        self.weights = weights
+        self.use_hold = use_hold
+        self.time_budget = time_budget
+        self.finesse = load_finesse_table() if finesse else None
+        self._probe = Probe() if finesse else None
+        self.plan = []
+        self._planned_piece = None
+        self.n_decisions = 0
+
+    def candidates(self, game, deadline=None):
+        """Yield (value, actions, placement, lines, used_hold) for every placement.
+
+        placement is (kind, orientation, x, y), or None if it tops out.
+        Placements of the hold piece are included if use_hold is set.
+        """
+        piece = game.active_piece
+        options = [(piece.kind, (piece.x, piece.y, piece.orientation), [])]
+        if self.use_hold and game.can_hold and (game.held_piece is None
+                                                or game.held_piece.kind != piece.kind):
+            held = game.held_piece if game.held_piece is not None else game.queue[1]
+            # Hold resets the piece to spawn, then gravity applies
+            if fits(game.board, held.kind, 0, 0, 1):
+                options.append((held.kind, (0, 1, 0), ["hold"]))
+
+        features = BoardFeatures(list(game.board))
+        for kind, start, prefix in options:
+            for x, y, orientation, actions in self.placements(game.board, kind, start, deadline):
+                if any(y + j <= 0 for _, j in SHAPES[kind][orientation]):
+                    yield GAME_OVER, prefix + actions, None, 0, bool(prefix)
+                    continue
+                n_cleared = features.apply(kind, orientation, x, y)
+                value = features.evaluate(n_cleared, self.weights)
+                features.undo()
+                yield value, prefix + actions, (kind, orientation, x, y), n_cleared, bool(prefix)
+
+    def placements(self, board, kind, start, deadline=None):
+        """Return (x, y, orientation, actions) of the placements to consider from start."""
+        if self.finesse is None:
+            return enumerate_placements(board, kind, start, deadline).values()
+        columns, probe = board_columns(board), self._probe
+        result, searched = [], None
+        for x, y, orientation in drop_placements(board, kind):
+            cells = frozenset((x + i, y + j) for i, j in SHAPES[kind][orientation])
+            actions = self.finesse[kind][orientation][x + FINESSE_OFFSET]
+            if actions is not None and probe.follow(board, columns, kind, start, actions) == cells:
+                result.append((x, y, orientation, list(actions)))
+                continue
+            # The stack is in the way of the open-air path, find one live
+            if searched is None:
+                searched = enumerate_placements(board, kind, start, deadline)
+            if cells in searched:
+                result.append(searched[cells])
+        return result
+
+    def decide(self, game):
+        """Return the action sequence of the best placement for the current piece."""
+        deadline = time.perf_counter() + self.time_budget if self.time_budget else None
+        best_value, best_actions = GAME_OVER, ["hard"]
+        for value, actions, _, _, _ in self.candidates(game, deadline):
+            if value > best_value or (value == best_value and len(actions) < len(best_actions)):
+                best_value, best_actions = value, actions
+        return best_actions
+
+    def reset(self, seed=None):
+        """Forget the current plan before a new game."""
+        self.plan = []
+        self._planned_piece = None
+
+    def next_action(self, game):
+        """Return the next action to play, planning a new placement for each new piece."""
+        if self._planned_piece != game.n_pieces or not self.plan:
+            self.plan = self.decide(game)
+            self._planned_piece = game.n_pieces
+            self.n_decisions += 1
+        return self.plan.pop(0)
+
+
+def beam_search(board, kinds, held, lines, beam_width, weights=DEFAULT_WEIGHTS, deadline=None):
+    """Return (value, finished): the best value reachable by placing kinds in order, with hold.
+
+    Each level keeps the beam_width best boards. Pieces are placed with
+    drop_placements, and a held piece can be swapped in (or the next piece
+    used) at every level. Children are scored with BoardFeatures apply/undo,
+    children reaching the same board and hold through different move orders
+    are merged, and only the boards kept in the beam are built. Placements
+    of a piece on a board come from the PLACEMENTS table when it has them.
+
+    deadline is a time.perf_counter() value. Once it has passed the search
+    stops, finished is False and value is the best of the last complete
+    level, which is on a different scale from full-depth values.
+    """
+    beam = [(BoardFeatures(board).evaluate(lines, weights), board, held, 0, lines)]
+    while True:
+        if deadline is not None and time.perf_counter() > deadline:
+            return max(node[0] for node in beam), False
+        children = {}
+        for _, board, held, index, lines in beam:
+            if index >= len(kinds):
+                continue
+            # (kind to place, held kind afterwards, index of the next piece)
+            options = [(kinds[index], held, index + 1)]
+            if held is None and index + 1 < len(kinds):
+                options.append((kinds[index + 1], kinds[index], index + 2))
+            elif held is not None and held != kinds[index]:
+                options.append((held, kinds[index], index + 1))
+            features = BoardFeatures(list(board))
+            for kind, next_held, next_index in options:
+                for x, y, orientation in cached_drop_placements(board, features.key, kind):
+                    n_cleared = features.apply(kind, orientation, x, y)
+                    value = features.evaluate(lines + n_cleared, weights)
+                    key = (features.key, next_held, next_index)
+                    features.undo()
+                    if key not in children or value > children[key][0]:
+                        children[key] = (value, board, (kind, orientation, x, y),
+                                         next_held, next_index, lines + n_cleared)
+            if deadline is not None and time.perf_counter() > deadline:
+                return max(node[0] for node in beam), False
+        if not children:
+            return max(node[0] for node in beam), True
+        best = heapq.nlargest(beam_width, children.values(), key=lambda node: node[0])
+        beam = [(value, place(board, *placement)[0], held, index, lines)
+                for value, board, placement, held, index, lines in best]
+
+
+class LookaheadAI(PlacementAI):
+    """Beam search a few pieces ahead through the queue and hold.
+
+    The best beam_width first placements are each searched further in a
+    process pool (if n_workers > 1) on plain board copies, and the first
+    move whose subtree scores best when the deadline is reached is played.
+    The pool starts on the first decision; use the AI as a context manager,
+    or call close(), to shut it down.
+    """
+
+    def __init__(self, depth=3, beam_width=8, n_workers=None, **kwargs):
+        super().__init__(**kwargs)
+        self.depth = depth
+        self.beam_width = beam_width
+        self.n_workers = n_workers
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut down the worker pool."""
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def decide(self, game):
+        """Return the action sequence of the first placement with the best lookahead."""
+        start = time.perf_counter()
+        deadline = start + self.time_budget if self.time_budget else None
+        roots = [candidate for candidate in self.candidates(game, deadline)
+                 if candidate[0] != GAME_OVER]
+        if not roots:
+            return super().decide(game)
+        roots = heapq.nlargest(self.beam_width, roots, key=lambda candidate: candidate[0])
+
+        # Pieces still to come after each first placement
+        piece, queue = game.active_piece, [p.kind for p in game.queue[1:]]
+        held = None if game.held_piece is None else game.held_piece.kind
+        subtrees = []
+        for value, actions, placement, lines, used_hold in roots:
+            board, _ = place(game.board, *placement)
+            if not used_hold:
+                subtrees.append((board, queue, held, lines))
+            elif held is None:
+                subtrees.append((board, queue[1:], piece.kind, lines))
+            else:
+                subtrees.append((board, queue, piece.kind, lines))
+
+        # perf_counter is system-wide on Linux, macOS and Windows, so the workers
+        # share the deadline
+        args = [(board, kinds[:self.depth - 1], held, lines, self.beam_width, self.weights,
+                 deadline) for board, kinds, held, lines in subtrees]
+        if self.n_workers is not None and self.n_workers <= 1:
+            results = [beam_search(*arg) for arg in args]
+        else:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.n_workers)
+            futures = [self.executor.submit(beam_search, *arg) for arg in args]
+            wait(futures, timeout=None if deadline is None
+                 else max(deadline - time.perf_counter(), 0))
+            # Subtrees that missed the deadline fall back to their first-placement value
+            results = [future.result() if future.done() else (root[0], False)
+                       for future, root in zip(futures, roots)]
+            for future in futures:
+                future.cancel()
+        # Values of unfinished subtrees are on another scale, so they only win if none finished
+        best = max(range(len(roots)),
+                   key=lambda k: (results[k][1], results[k][0], -len(roots[k][1])))
+        return roots[best][1]
@@ -0,0 +1,159 @@
+"""Play many seeded headless games over a process pool and summarise the results.
+
+    python selfplay.py --policy heuristic --games 1000 --output results.jsonl
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from engine import ACTIONS
+from replay import Replay
+from search import PlacementAI, LookaheadAI
+
+PERCENTILES = (5, 25, 50, 75, 95)
+STATS = ("score", "lines", "pieces", "decisions_per_s")
+
+
+class RandomPolicy:
+    """Play uniformly random actions."""
+
+    def __init__(self):
+        self.rng = random.Random()
+        self.n_decisions = 0
+
+    def reset(self, seed=None):
+        """Reseed before a new game."""
+        self.rng.seed(seed)
+
+    def next_action(self, game):
+        """Return a random action."""
+        self.n_decisions += 1
+        return self.rng.choice(ACTIONS)
+
+
+POLICIES = {
+    "random": RandomPolicy,
+    "heuristic": lambda: PlacementAI(time_budget=None),
+    "finesse": lambda: PlacementAI(time_budget=None, finesse=True),
+    "search": lambda: LookaheadAI(n_workers=1, time_budget=None),
+}
+
+
+def play_game(policy, seed, mode="snes", n_blocks_in_queue=3, max_pieces=1000):
+    """Let policy play one seeded game, return its result as a dict."""
+    game = Replay(seed, mode, n_blocks_in_queue).new_game()
+    policy.reset(seed)
+    decisions = policy.n_decisions
+    start = time.perf_counter()
+    ticks = 0
+    while not game.game_over and game.n_pieces <= max_pieces:
+        game.step(policy.next_action(game))
+        ticks += 1
+    duration = time.perf_counter() - start
+    decisions = policy.n_decisions - decisions
+    return {
+        "seed": seed,
+        "score": game.score,
+        "lines": game.lines,
+        "pieces": game.n_pieces,
+        "ticks": ticks,
+        "game_over": game.game_over,
+        "duration": duration,
+        "decisions_per_s": decisions / duration if duration else 0.0,
+    }
+
+
+# Policy of the current worker process, created once and reused between games
+_worker = None
+
+
+def _init_worker(policy_name, options):
+    global _worker
+    _worker = (POLICIES[policy_name](), options)
+
+
+def _play(seed):
+    policy, options = _worker
+    return play_game(policy, seed, **options)
+
+
+def run_games(policy_name, seeds, n_workers=None, **options):
+    """Yield the result of every game in seed order, played over n_workers processes.
+
+    Each worker creates its policy once and reuses it for all of its games.
+    """
+    if n_workers == 1:
+        _init_worker(policy_name, options)
+        yield from map(_play, seeds)
+        return
+    with ProcessPoolExecutor(n_workers, initializer=_init_worker,
+                             initargs=(policy_name, options)) as executor:
+        yield from executor.map(_play, seeds, chunksize=max(1, min(16, len(seeds) // 64)))
+
+
+def percentile(values, p):
+    """Linearly interpolated p-th percentile of a non-empty list of values."""
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def summarise(results):
+    """Return {stat: {"mean": ..., "p5": ..., ...}} over a list of game results ({} if empty)."""
+    summary = {}
+    if not results:
+        return summary
+    for stat in STATS:
+        values = [result[stat] for result in results]
+        summary[stat] = {"mean": sum(values) / len(values)}
+        for p in PERCENTILES:
+            summary[stat][f"p{p}"] = percentile(values, p)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play seeded headless games over a process pool.")
+    parser.add_argument("--policy", choices=POLICIES, default="heuristic")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first game, the next games count up from it")
+    parser.add_argument("--mode", default="snes", help="piece generator: snes or bag")
+    parser.add_argument("--queue", type=int, default=3, help="number of blocks in queue")
+    parser.add_argument("--max-pieces", type=int, default=1000,
+                        help="stop games after this many pieces")
+    parser.add_argument("--workers", type=int, default=None, help="processes, all cores by default")
+    parser.add_argument("--output", help="JSONL file for per-game results (stdout by default)")
+    args = parser.parse_args()
+    if args.games < 1:
+        parser.error("--games must be at least 1")
+
+    seeds = range(args.seed, args.seed + args.games)
+    output = open(args.output, "w") if args.output else sys.stdout
+    results = []
+    start = time.perf_counter()
+    try:
+        for result in run_games(args.policy, seeds, args.workers, mode=args.mode,
+                                n_blocks_in_queue=args.queue, max_pieces=args.max_pieces):
+            results.append(result)
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(results)} games in {elapsed:.1f}s ({len(results) / elapsed:.1f} games/s)",
+          file=sys.stderr)
+    columns = ("mean",) + tuple(f"p{p}" for p in PERCENTILES)
+    print(f"{'':>16}" + "".join(f"{column:>10}" for column in columns), file=sys.stderr)
+    for stat, values in summarise(results).items():
+        print(f"{stat:>16}" + "".join(f"{values[column]:10.1f}" for column in columns),
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
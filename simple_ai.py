@@ -1,17 +1,10 @@
 import random
-import pygame
-from pygame.locals import KEYDOWN, K_ESCAPE
-from utils import Timer
-from screen import Screen
-from blocks import BlockManager
+from utils import FixedTimestep
+from replay import Replay
+from search import PlacementAI
 
 
-def run_random_ai(mngr, screen):
-    """Temporary AI that returns random actions."""
-    return random.choice(["right", "clockwise", "down", "left"])
-
-
-def run_game_loop(action, score, mngr, screen, borders, surf):
+def run_game_loop(action, game):
     """
     Run game logic given AI inputs.
 
@@ -21,111 +14,100 @@ def run_game_loop(action, score, mngr, screen, borders, surf):
      - hold piece
      - hard drop
     """
-    #FIXME
-    for event in pygame.event.get():
-        if event.type == KEYDOWN and event.key == K_ESCAPE:
-            return "STOP", score, mngr, screen
-
-    if action in ["left", "right", "down"]:
-        mngr.active_piece.move(screen, action)
-
-    elif action in ["clockwise", "counterclockwise"]:
-        mngr.active_piece.rotate(screen, {"clockwise": "w", "counterclockwise": "e"}[action])
-
-    elif action == "hard":
-        while mngr.active_piece.move(screen, "down"):
-            pass
-
-    elif action == "hold":
-        if mngr.can_hold and not (mngr.held_piece is not None\
-                and mngr.held_piece.block_type == mngr.active_piece.block_type):
-            mngr.hold_piece(screen)
-
-            # Check
-
-    # Now update pieces and score
-    has_moved_down = mngr.active_piece.move(screen, "down")
-    if not has_moved_down:
-        if any([block.j <= 0 for block in mngr.active_piece.blocks]):
-            return "STOP", score, mngr, screen
-        mngr.remove_active(screen)
-
-        # Check for line clear
-        indices_to_clear, to_remove = [], []
-        for j, line in enumerate(screen.checksum):
-            if line.checksum != 1023:
-                continue
-
-            indices_to_clear.append(j)
-            for block in mngr.inactive_blocks:
-                if block.j == j:
-                    to_remove.append(block)
+    if game.step(action).game_over:
+        return "STOP", game
+    return "RUNNING", game
 
-        # Update score
-        score_table = {0: 0, 1: 40, 2: 100, 3: 300, 4: 1200}
-        score += score_table[len(indices_to_clear)]
 
-        # Clear lines
-        for block in to_remove:
-            screen.checksum[block.j][block.i] = 0
-            mngr.inactive_blocks.remove(block)
+def at_limit(game, ticks, max_pieces=None, max_ticks=None):
+    """Whether a game has played more than max_pieces pieces or max_ticks ticks (None: no limit)."""
+    return ((max_pieces is not None and game.n_pieces > max_pieces)
+            or (max_ticks is not None and ticks >= max_ticks))
 
-        # Update blocks above cleared lines
-        for j in indices_to_clear:
-            blocks_to_move = [block for block in mngr.inactive_blocks if block.j < j]
-            for block in blocks_to_move:
-                screen.checksum[block.j][block.i] = 0
 
-            for block in blocks_to_move:
-                block.move("down")
-                block.update(screen, update_grid=True)
+def main(headless=False, seed=None, mode="snes", replay_path=None, tickrate=10, fps=60,
+         channel=None, max_pieces=None, max_ticks=None):
+    """Let the AI play one game, optionally recording it to replay_path.
 
-        mngr.spawn_new_piece(screen)
-
-    # Draw updates
-    mngr.active_blocks.update(screen)
-    surf.fill((0, 0, 0))
-    for group in borders, mngr.active_blocks, mngr.inactive_blocks:
-        group.draw(surf)
-    screen.draw_queue(surf, mngr.queue)
-    screen.draw_held(surf, mngr.held_piece)
-
-    return "RUNNING", score, mngr, screen
-
-
-def main():
+    The AI plays tickrate actions per second on a fixed timestep, drawn at up
+    to fps frames per second; tickrate=None plays as fast as possible and
+    fps=None draws uncapped. With a channel.SharedChannel, the actions come
+    from the policy process attached to it instead, which also gets the
+    final state. The game stops early after max_pieces pieces or max_ticks
+    ticks, as in selfplay.play_game.
+    """
     # Define game variables
     n_blocks_in_queue = 3
+    if seed is None:
+        seed = random.getrandbits(63)
+    replay = Replay(seed, mode, n_blocks_in_queue)
+    game = replay.new_game()
+    ai = PlacementAI() if channel is None else channel
+    ticks = 0
+    if headless:
+        state = "RUNNING"
+        while state == "RUNNING" and not at_limit(game, ticks, max_pieces, max_ticks):
+            ticks += 1
+            action = ai.next_action(game)
+            replay.record(action)
+            state, game = run_game_loop(action, game)
+        if channel is not None:
+            channel.publish(game)
+        if replay_path is not None:
+            replay.save(replay_path)
+        return game
+
+    # Only drawing needs pygame, headless games and importing this module don't
+    import pygame
+    from pygame.locals import KEYDOWN, K_ESCAPE
+    from screen import Screen
+    from render import Renderer
     clock = pygame.time.Clock()
-    # timer = Timer(interval=200, delta=150, soft_delay=100)
-    score = 0
+    loop = FixedTimestep(1000 / (tickrate or 10), realtime=tickrate is not None)
 
     # Process
     screen = Screen(400, epsilon=0.05, left_space=4, right_space=4)
     borders, surf = screen.setup_screen()
-    surf.fill((0, 0, 0))
-    borders.update(screen)
-    borders.draw(surf)
-
-    # Init blocks and screen
-    mngr = BlockManager(screen, surf, n_blocks_in_queue)
-    pygame.display.flip()
+    renderer = Renderer(screen, borders, surf)
+    renderer.draw(game)
 
     # Game loop
-    while True:
-        key_presses = run_random_ai(mngr, screen)
-        state, score, mngr, screen = run_game_loop(
-            key_presses, score, mngr, screen, borders, surf)
-        screen.set_score(score)
-
+    state = "RUNNING"
+    while state == "RUNNING":
+        for event in pygame.event.get():
+            if event.type == KEYDOWN and event.key == K_ESCAPE:
+                state = "STOP"
         if state == "STOP":
             break
 
-        screen.draw_score(surf)
-        pygame.display.flip()
-        clock.tick(10)
-
-
-pygame.init()
-main()
-pygame.quit()
+        n_steps = loop.advance()
+        for _ in range(n_steps):
+            if at_limit(game, ticks, max_pieces, max_ticks):
+                state = "STOP"
+                break
+            ticks += 1
+            loop.step()
+            key_presses = ai.next_action(game)
+            replay.record(key_presses)
+            state, game = run_game_loop(key_presses, game)
+            if state == "STOP":
+                break
+
+        if n_steps:
+            renderer.draw(game)
+        if fps:
+            clock.tick(fps)
+        elif loop.realtime and not n_steps:
+            pygame.time.wait(int(loop.step_ms - loop.accumulator))
+    if channel is not None:
+        channel.publish(game)
+    if replay_path is not None:
+        replay.save(replay_path)
+    return game
+
+
+if __name__ == '__main__':
+    import pygame
+    pygame.init()
+    main()
+    pygame.quit()
@@ -0,0 +1,80 @@
+"""Checks of the shared memory game/policy channel, run with python -m pytest."""
+import multiprocessing
+import pytest
+from channel import SharedChannel, run_policy
+from engine import ACTIONS
+from replay import Replay
+from search import PlacementAI
+
+SEED = 1234
+
+
+def observed(observation):
+    """The values of an observation as plain Python objects."""
+    return {name: view.tolist() for name, view in observation.items()}
+
+
+def game_observation(game, seq):
+    """What SharedChannel.publish writes for game."""
+    piece = game.active_piece
+    return {
+        "seq": seq,
+        "board": game.board,
+        "piece": [piece.kind, piece.x, piece.y, piece.orientation],
+        "queue": [queued.kind for queued in game.queue[1:]],
+        "held": -1 if game.held_piece is None else game.held_piece.kind,
+        "can_hold": int(game.can_hold),
+        "game_over": int(game.game_over),
+        "score": game.score,
+        "lines": game.lines,
+        "n_pieces": game.n_pieces,
+    }
+
+
+def checksum(values):
+    """An action picked from every field of an observation's values."""
+    total = sum(values["board"]) + sum(values["piece"]) + sum(values["queue"])
+    total += values["held"] + values["score"] + values["lines"] + values["n_pieces"]
+    return ACTIONS[total % len(ACTIONS)]
+
+
+def checksum_policy(observation):
+    """Policy answering with the checksum, so the game side can tell what it saw."""
+    return checksum(observed(observation))
+
+
+def test_published_observations_follow_the_game():
+    """Each publish fills the next ring slot with the game's state."""
+    channel = SharedChannel.create(n_slots=4)
+    try:
+        ai = PlacementAI(time_budget=None)
+        game = Replay(SEED).new_game()
+        for seq in range(1, 60):
+            assert channel.publish(game) == seq
+            assert observed(channel.observations[seq % 4]) == game_observation(game, seq)
+            game.step(ai.next_action(game))
+        assert game.n_pieces > 1 and game.held_piece is not None
+        with pytest.raises(TimeoutError):
+            channel.wait_action(seq, timeout=0.01)
+    finally:
+        channel.close()
+
+
+def test_policy_process_answers_every_step():
+    """A policy process gets every state and its answers drive the game."""
+    channel = SharedChannel.create()
+    policy = multiprocessing.Process(target=run_policy, args=(channel.name, checksum_policy, 10))
+    policy.start()
+    try:
+        game = Replay(SEED).new_game()
+        for seq in range(1, 300):
+            assert channel.publish(game) == seq
+            action = channel.wait_action(seq, timeout=10)
+            assert action == checksum(game_observation(game, seq))
+            game.step(action)
+            if game.game_over:
+                game = Replay(SEED).new_game()
+    finally:
+        channel.close()
+        policy.join(10)
+    assert policy.exitcode == 0
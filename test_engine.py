@@ -0,0 +1,95 @@
+"""Checks that the fast paths agree with engine.Game, run with python -m pytest."""
+import numpy as np
+from batch import BatchTetris
+from engine import Game, ACTIONS, N_ROWS, N_COLS, FULL_ROW, board_columns
+from pieces import BLOCK_TYPES
+from search import enumerate_placements
+
+SEED = 1234
+
+
+def set_board(game, board):
+    """Replace the locked cells of game by the row masks in board."""
+    game.board = list(board)
+    game.columns = board_columns(game.board)
+
+
+def test_hard_drop_into_the_stack_ends_the_game():
+    """A piece spawned into the stack locks in place instead of dropping through it."""
+    game = Game(seed=SEED)
+    game.active_piece.respawn("O")
+    board = [0, FULL_ROW & ~1] + [0] * (N_ROWS - 2)
+    set_board(game, board)
+    events = game.step("hard")
+    assert events.game_over and game.game_over
+    assert game.board == board and game.active_piece.y == 0
+
+    placements = enumerate_placements(board, game.active_piece.kind, (0, 0, 0))
+    assert all(y == 0 for x, y, orientation, actions in placements.values()
+               if actions == ["hard"])
+
+
+def new_batch_games(batch, boards):
+    """Games with the boards and piece queues of batch, after setting its boards."""
+    games = []
+    for b, board in enumerate(boards):
+        game = Game(seed=SEED)
+        for piece, kind in zip(game.queue, batch.queue[b]):
+            piece.respawn(BLOCK_TYPES[kind])
+        set_board(game, board)
+        games.append(game)
+    batch.board = np.array(boards, dtype=np.uint16)
+    return games
+
+
+def step_along(batch, games, actions):
+    """Step batch and games with the same actions and check that they stay equal."""
+    batch.step(actions)
+    board = batch.board
+    for b, game in enumerate(games):
+        if game.game_over:
+            continue
+        game.step(ACTIONS[actions[b]])
+        # Pieces drawn this step come from the batch's generator
+        for piece, kind in zip(game.queue, batch.queue[b]):
+            if piece.kind != kind:
+                piece.respawn(BLOCK_TYPES[kind])
+        assert game.game_over == batch.game_over[b]
+        if game.game_over:
+            continue
+        piece = game.active_piece
+        assert game.board == board[b].tolist()
+        assert (piece.x, piece.y, piece.orientation) == (batch.x[b], batch.y[b],
+                                                         batch.orientation[b])
+        held = -1 if game.held_piece is None else game.held_piece.kind
+        assert (held, game.can_hold) == (batch.held[b], batch.can_hold[b])
+        assert (game.score, game.lines) == (batch.score[b], batch.lines[b])
+
+
+def test_batch_matches_game():
+    """BatchTetris steps like one Game per row, given the same piece draws."""
+    n_games = 32
+    rng = np.random.default_rng(SEED)
+    batch = BatchTetris(n_games, seed=SEED)
+    # Half-full boards, so lines get cleared and pieces block out
+    boards = [[0] * (N_ROWS // 2) + [FULL_ROW & ~(1 << int(rng.integers(N_COLS)))] * (N_ROWS // 2)
+              for _ in range(n_games)]
+    games = new_batch_games(batch, boards)
+    for _ in range(500):
+        actions = rng.integers(len(ACTIONS), size=n_games)
+        actions[rng.random(n_games) < 0.3] = ACTIONS.index("hard")
+        step_along(batch, games, actions)
+    assert batch.lines.sum() and batch.game_over.sum()
+
+
+def test_batch_piece_spawned_into_a_floating_cell():
+    """Pieces spawned over a loose cell on the top row can still fall, but not hard drop."""
+    batch = BatchTetris(len(ACTIONS) * len(BLOCK_TYPES), seed=SEED)
+    batch.queue[:, 0] = np.repeat(np.arange(len(BLOCK_TYPES)), len(ACTIONS))
+    games = new_batch_games(batch, [[1 << 4] + [0] * (N_ROWS - 1)] * batch.n_games)
+    actions = np.tile(np.arange(len(ACTIONS)), len(BLOCK_TYPES))
+    step_along(batch, games, actions)
+    assert batch.game_over[actions == ACTIONS.index("hard")].all()
+    for _ in range(N_ROWS):
+        step_along(batch, games, np.full(batch.n_games, ACTIONS.index("down")))
+    assert not batch.game_over.all()
@@ -0,0 +1,46 @@
+"""Checks of the TetrisEnv observation buffers, run with python -m pytest."""
+import numpy as np
+from engine import ACTIONS, N_ROWS, N_COLS
+from env import TetrisEnv
+from search import PlacementAI
+
+SEED = 1234
+
+
+def scanned_features(board):
+    """Column heights, holes per column and bumpiness of board, from scratch."""
+    cells = [[(row >> i) & 1 for i in range(N_COLS)] for row in board]
+    heights, holes = [], []
+    for i in range(N_COLS):
+        column = [cells[j][i] for j in range(N_ROWS)]
+        top = column.index(1) if 1 in column else N_ROWS
+        heights.append(N_ROWS - top)
+        holes.append(column[top:].count(0))
+    bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+    return heights + holes + [bumpiness]
+
+
+def test_env_observations_follow_the_game():
+    """Every step's buffers hold the game's board, pieces and features."""
+    env = TetrisEnv(features=True)
+    obs = env.reset(seed=SEED)
+    ai = PlacementAI(time_budget=None)
+    board, pieces, features = obs["board"], obs["pieces"], obs["features"]
+    done = False
+    while not done and env.game.n_pieces <= 60:
+        game = env.game
+        score = game.score
+        obs, reward, done, info = env.step(ACTIONS.index(ai.next_action(game)))
+        # The same buffers are filled in place
+        assert obs["board"] is board and obs["pieces"] is pieces and obs["features"] is features
+        rows = [int(sum(int(cell) << i for i, cell in enumerate(row))) for row in board]
+        assert rows == game.board
+        held = -1 if game.held_piece is None else game.held_piece.kind
+        assert pieces.tolist() == [piece.kind for piece in game.queue] + [held]
+        assert features.tolist() == scanned_features(game.board)
+        assert (reward, done) == (game.score - score, game.game_over)
+        assert info == {"lines": game.lines, "pieces": game.n_pieces}
+    assert env.game.lines and np.any(board)
+
+    obs = env.reset(seed=SEED)
+    assert not obs["board"].any() and not obs["features"].any()
@@ -0,0 +1,40 @@
+"""Checks of the incremental board features, run with python -m pytest."""
+import random
+from engine import N_ROWS
+from features import BoardFeatures
+from pieces import BLOCK_TYPES
+from search import drop_placements, place
+
+SEED = 1234
+
+
+def test_features_apply_undo():
+    """BoardFeatures after apply() match a fresh scan of the new board, and undo() restores them."""
+    def snapshot(features):
+        return (list(features.heights), features.aggregate_height, features.n_cells,
+                features.transitions, features.bumpiness, features.holes, features.wells,
+                features.key)
+
+    rng = random.Random(SEED)
+    n_cleared = 0
+    for _ in range(20):
+        board = [0] * N_ROWS
+        features = BoardFeatures(list(board))
+        for _ in range(60):
+            kind = rng.randrange(len(BLOCK_TYPES))
+            placements = [p for p in drop_placements(board, kind) if p[1] > 1]
+            if not placements:
+                break
+            for x, y, orientation in placements:
+                before = snapshot(features)
+                lines = features.apply(kind, orientation, x, y)
+                expected, expected_lines = place(board, kind, orientation, x, y)
+                assert (features.board, lines) == (expected, expected_lines)
+                assert snapshot(features) == snapshot(BoardFeatures(list(expected)))
+                n_cleared += lines
+                features.undo()
+                assert features.board == board and snapshot(features) == before
+            x, y, orientation = rng.choice(placements)
+            features.apply(kind, orientation, x, y)
+            board, _ = place(board, kind, orientation, x, y)
+    assert n_cleared
@@ -0,0 +1,126 @@
+"""Checks of the search AIs against engine.Game, run with python -m pytest."""
+import random
+import time
+from engine import Game, N_ROWS, board_columns
+from pieces import BLOCK_TYPES, SHAPES
+from replay import Replay
+from search import LookaheadAI, PlacementAI, enumerate_placements, drop_placements, place, \
+    build_finesse_table, load_finesse_table, FINESSE_OFFSET
+
+SEED = 1234
+
+
+def random_stacks(n_boards, n_pieces=12):
+    """Boards built by dropping random pieces at random spots, so they have overhangs."""
+    rng = random.Random(SEED)
+    boards = []
+    for _ in range(n_boards):
+        board = [0] * N_ROWS
+        for _ in range(n_pieces):
+            kind = rng.randrange(len(BLOCK_TYPES))
+            placements = [p for p in drop_placements(board, kind) if p[1] > 2]
+            if not placements:
+                break
+            x, y, orientation = rng.choice(placements)
+            board, _ = place(board, kind, orientation, x, y)
+        boards.append(board)
+    return boards
+
+
+def new_game(board, kind):
+    """A game on board with a freshly spawned piece of kind."""
+    game = Game(seed=SEED)
+    game.active_piece.respawn(BLOCK_TYPES[kind])
+    game.board = list(board)
+    game.columns = board_columns(game.board)
+    return game
+
+
+def test_placement_paths_land_where_enumerated():
+    """Every path from enumerate_placements, played with Game.step, locks the piece on its cells."""
+    for board in random_stacks(20):
+        for kind in range(len(BLOCK_TYPES)):
+            for cells, (x, y, orientation, actions) in enumerate_placements(
+                    board, kind, (0, 0, 0)).items():
+                assert cells == {(x + i, y + j) for i, j in SHAPES[kind][orientation]}
+                game = new_game(board, kind)
+                for action in actions[:-1]:
+                    assert not game.step(action).locked
+                events = game.step(actions[-1])
+                if any(j <= 0 for _, j in cells):
+                    assert events.game_over
+                    continue
+                assert events.locked
+                assert game.board == place(board, kind, orientation, x, y)[0]
+
+
+def play_path(board, kind, actions):
+    """Play actions with Game.step from spawn, return the board after the last one locks."""
+    game = new_game(board, kind)
+    for action in actions[:-1]:
+        assert not game.step(action).locked
+    assert game.step(actions[-1]).locked
+    return game.board
+
+
+def test_finesse_table_covers_every_drop_placement():
+    """Every open-air drop placement has a table path, which lands there and is cached."""
+    board = [0] * N_ROWS
+    table = build_finesse_table()
+    for kind in range(len(BLOCK_TYPES)):
+        for x, y, orientation in drop_placements(board, kind):
+            actions = table[kind][orientation][x + FINESSE_OFFSET]
+            assert actions
+            assert play_path(board, kind, actions) == place(board, kind, orientation, x, y)[0]
+
+
+def test_finesse_table_is_cached(tmp_path):
+    """The table is saved on first load and read back as it was built."""
+    path = str(tmp_path / "finesse.json")
+    table = load_finesse_table(path)
+    load_finesse_table.cache_clear()
+    assert (tmp_path / "finesse.json").exists()
+    assert load_finesse_table(path) == table == build_finesse_table()
+
+
+def test_finesse_placements_match_the_live_search():
+    """On stacks, the finesse AI finds the same drop placements as enumerate_placements."""
+    ai = PlacementAI(time_budget=None, finesse=True)
+    for board in random_stacks(10):
+        for kind in range(len(BLOCK_TYPES)):
+            live = enumerate_placements(board, kind, (0, 0, 0))
+            drops = {frozenset((x + i, y + j) for i, j in SHAPES[kind][orientation])
+                     for x, y, orientation in drop_placements(board, kind)}
+            found = set()
+            for x, y, orientation, actions in ai.placements(board, kind, (0, 0, 0)):
+                cells = frozenset((x + i, y + j) for i, j in SHAPES[kind][orientation])
+                found.add(cells)
+                if all(j > 0 for _, j in cells):
+                    assert play_path(board, kind, actions) == \
+                        place(board, kind, orientation, x, y)[0]
+            assert found == drops & set(live)
+
+
+def test_lookahead_plays_and_respects_the_deadline():
+    """LookaheadAI plays legal placements, and a tiny time budget still gives a quick decision."""
+    with LookaheadAI(n_workers=1, time_budget=None) as ai:
+        game = Replay(SEED).new_game()
+        while not game.game_over and game.n_pieces <= 30:
+            game.step(ai.next_action(game))
+        assert not game.game_over and game.lines
+        assert ai.executor is None
+
+    with LookaheadAI(depth=4, beam_width=16, n_workers=1, time_budget=0.001) as ai:
+        start = time.perf_counter()
+        actions = ai.decide(game)
+        assert time.perf_counter() - start < 0.1
+        assert actions
+
+
+def test_lookahead_pool_starts_lazily():
+    """The worker pool only starts on the first decision and stops when the AI is closed."""
+    with LookaheadAI(n_workers=2, time_budget=None) as ai:
+        assert ai.executor is None
+        ai.decide(Replay(SEED).new_game())
+        assert ai.executor is not None
+    assert ai.executor is None
@@ -0,0 +1,56 @@
+"""Checks of garbage lines and versus matches, run with python -m pytest."""
+import asyncio
+from engine import Game, N_ROWS, N_COLS, FULL_ROW, board_columns
+from features import BoardFeatures
+from versus import Match, load_test
+
+SEED = 1234
+
+
+def stack_height(board):
+    """Height of the highest column of board."""
+    return max(BoardFeatures(board).heights)
+
+
+def test_garbage_pushes_the_stack_up():
+    """Garbage rows go under the stack, and too many of them end the game."""
+    game = Game(seed=SEED)
+    game.step("hard")
+    height = stack_height(game.board)
+    game.add_garbage(3, 0)
+    assert not game.game_over
+    assert stack_height(game.board) == height + 3
+    assert game.board[-3:] == [FULL_ROW & ~1] * 3
+    assert game.columns == board_columns(game.board)
+    assert len(game.cells) == N_ROWS * N_COLS
+
+    game.add_garbage(N_ROWS + 5, 1)
+    assert game.game_over
+    assert game.board == [FULL_ROW & ~2] * N_ROWS
+    assert len(game.cells) == N_ROWS * N_COLS
+
+
+def test_match_sends_garbage_for_a_tetris():
+    """A four-line clear sends four garbage lines, added when the opponent locks a piece."""
+    match = Match(SEED)
+    sender, receiver = match.games
+    sender.active_piece.respawn("I")
+    match.step(["clockwise", None], gravity=False)
+    sender.add_garbage(4, sender.active_piece.cells[0][0])
+
+    events = match.step(["hard", "hard"])
+    assert events[0].lines_cleared == 4 and events[1].locked
+    assert sender.board == [0] * N_ROWS
+    assert match.pending == [0, 0]
+    holes = {FULL_ROW & ~row for row in receiver.board[-4:]}
+    assert len(holes) == 1 and holes.pop().bit_count() == 1
+    assert stack_height(receiver.board) > 4
+    assert not match.over
+
+
+def test_load_test_plays_a_match():
+    """Two bots play one match to the end on a local server."""
+    results, stats, _ = asyncio.run(load_test(2, "random", 0, tickrate=1000, gravity_every=1,
+                                              max_ticks=300))
+    assert stats["matches_played"] == 1
+    assert sorted(result["result"] for result in results) in (["draw", "draw"], ["lose", "win"])
@@ -0,0 +1,63 @@
+"""Bounded LRU transposition table for search results keyed by packed boards."""
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TranspositionTable:
+    """Map int keys to search results, dropping the least recently used.
+
+    Keys are packed boards (see engine.pack_board and BoardFeatures.key),
+    combined with whatever else the result depends on; search.PLACEMENTS
+    uses features.key << 3 | kind. Counts hits, misses and evictions, so
+    the hit rate of a search can be checked with stats().
+    """
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """Return the result stored for key and mark it recently used, or default."""
+        value = self.entries.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Store a result, evicting the least recently used one if the table is full."""
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+        entries[key] = value
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return the counters, the size and the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,234 @@
+"""Tune the heuristic weights with CMA-ES over seeded headless games.
+
+    python tune.py --generations 50 --games 8 --checkpoint tune.json
+
+Rerunning with the same checkpoint resumes where the last run stopped.
+"""
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from engine import N_ROWS
+from features import BoardFeatures
+from pieces import BLOCK_INDEX, SHAPES
+from randomizer import make_generator
+from search import DEFAULT_WEIGHTS, drop_placements
+
+
+def play_placements(weights, seed, mode="snes", max_pieces=500):
+    """Return the lines cleared by the heuristic dropping pieces straight onto the board.
+
+    This is the fitness game: no ticks, hold or tucks, just the best drop
+    placement of every piece, scored with BoardFeatures apply/undo.
+    """
+    generator = make_generator(mode, seed)
+    board = [0] * N_ROWS
+    features = BoardFeatures(board)
+    lines = 0
+    for _ in range(max_pieces):
+        kind = BLOCK_INDEX[generator.next()]
+        best, best_value = None, None
+        for x, y, orientation in drop_placements(board, kind):
+            if any(y + j <= 0 for _, j in SHAPES[kind][orientation]):
+                continue
+            value = features.evaluate(lines + features.apply(kind, orientation, x, y), weights)
+            features.undo()
+            if best_value is None or value > best_value:
+                best, best_value = (kind, orientation, x, y), value
+        if best is None:
+            break
+        lines += features.apply(*best)
+    return lines
+
+
+def fitness(weights, seeds, mode="snes", max_pieces=500, cutoff=None, min_games=2):
+    """Mean lines over games on seeds, and the number of games played.
+
+    Once min_games are played, a candidate whose mean is below cutoff is
+    clearly bad and stops early.
+    """
+    total = 0
+    for k, seed in enumerate(seeds, 1):
+        total += play_placements(weights, seed, mode, max_pieces)
+        if cutoff is not None and k >= min_games and total / k < cutoff:
+            return total / k, k
+    return total / len(seeds), len(seeds)
+
+
+class CMAES:
+    """Covariance matrix adaptation evolution strategy, maximising a fitness.
+
+    ask() samples a population of candidates, tell() updates the search
+    distribution from their fitnesses. The state is plain data (state() and
+    from_state()), so it can be checkpointed as JSON.
+    """
+
+    def __init__(self, mean, sigma, population=None, seed=None):
+        n = len(mean)
+        self.mean = np.array(mean, dtype=float)
+        self.sigma = sigma
+        self.population = population or 4 + int(3 * math.log(n))
+        self.rng = np.random.default_rng(seed)
+        self.C = np.eye(n)
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.generation = 0
+        self._setup()
+
+    def _setup(self):
+        """Derive the strategy constants and the eigendecomposition of C."""
+        n, mu = len(self.mean), self.population // 2
+        weights = math.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / (self.weights ** 2).sum()
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1,
+                       2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff))
+        self.damps = 1 + 2 * max(0, math.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = math.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+        eigenvalues, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+    def ask(self):
+        """Sample the candidates of the next generation, as a (population, n) array."""
+        z = self.rng.standard_normal((self.population, len(self.mean)))
+        return self.mean + self.sigma * (z * self.D) @ self.B.T
+
+    def tell(self, candidates, fitnesses):
+        """Move the distribution towards the candidates with the highest fitness."""
+        n, mu = len(self.mean), len(self.weights)
+        order = np.argsort(fitnesses)[::-1][:mu]
+        y = (np.asarray(candidates)[order] - self.mean) / self.sigma
+        y_w = self.weights @ y
+        self.mean = self.mean + self.sigma * y_w
+
+        inv_sqrt_c = self.B @ np.diag(1 / self.D) @ self.B.T
+        self.ps = ((1 - self.cs) * self.ps
+                   + math.sqrt(self.cs * (2 - self.cs) * self.mueff) * inv_sqrt_c @ y_w)
+        norm_ps = np.linalg.norm(self.ps)
+        hsig = (norm_ps / math.sqrt(1 - (1 - self.cs) ** (2 * (self.generation + 1))) / self.chi_n
+                < 1.4 + 2 / (n + 1))
+        self.pc = ((1 - self.cc) * self.pc
+                   + hsig * math.sqrt(self.cc * (2 - self.cc) * self.mueff) * y_w)
+        rank_one = np.outer(self.pc, self.pc) + (1 - hsig) * self.cc * (2 - self.cc) * self.C
+        rank_mu = (y.T * self.weights) @ y
+        self.C = (1 - self.c1 - self.cmu) * self.C + self.c1 * rank_one + self.cmu * rank_mu
+        self.sigma *= math.exp(self.cs / self.damps * (norm_ps / self.chi_n - 1))
+        self.generation += 1
+        self._setup()
+
+    def state(self):
+        """JSON-serialisable state, including the random generator."""
+        return {
+            "mean": self.mean.tolist(),
+            "sigma": self.sigma,
+            "population": self.population,
+            "C": self.C.tolist(),
+            "pc": self.pc.tolist(),
+            "ps": self.ps.tolist(),
+            "generation": self.generation,
+            "rng": self.rng.bit_generator.state,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a CMAES from state()."""
+        strategy = cls(state["mean"], state["sigma"], state["population"])
+        strategy.C = np.array(state["C"])
+        strategy.pc = np.array(state["pc"])
+        strategy.ps = np.array(state["ps"])
+        strategy.generation = state["generation"]
+        strategy.rng.bit_generator.state = state["rng"]
+        strategy._setup()
+        return strategy
+
+
+def normalise(weights):
+    """Scale weights to unit length, the heuristic only depends on their direction."""
+    weights = np.asarray(weights, dtype=float)
+    return tuple((weights / np.linalg.norm(weights)).tolist())
+
+
+def save_checkpoint(path, strategy, best):
+    """Write the search state atomically, so an interrupted write can't corrupt it."""
+    with open(path + ".tmp", "w") as file:
+        json.dump({"strategy": strategy.state(), "best": best}, file)
+    os.replace(path + ".tmp", path)
+
+
+def _evaluate(args):
+    return fitness(*args)
+
+
+def tune(generations=50, n_games=8, mode="snes", max_pieces=500, sigma=0.3, population=None,
+         seed=0, checkpoint=None, n_workers=None):
+    """Run CMA-ES from DEFAULT_WEIGHTS and return the best {"weights", "fitness"} found.
+
+    Every candidate of a generation plays the same seeds (common random
+    numbers), and candidates scoring under half the last generation's
+    selection cutoff stop early.
+    """
+    best = {"weights": normalise(DEFAULT_WEIGHTS), "fitness": None, "generation": None}
+    if checkpoint is not None and os.path.exists(checkpoint):
+        with open(checkpoint) as file:
+            data = json.load(file)
+        strategy, best = CMAES.from_state(data["strategy"]), data["best"]
+        print(f"resuming from generation {strategy.generation}")
+    else:
+        strategy = CMAES(best["weights"], sigma, population, seed)
+
+    cutoff = None
+    with ProcessPoolExecutor(n_workers) as executor:
+        while strategy.generation < generations:
+            start = time.perf_counter()
+            seeds = [seed + strategy.generation * n_games + k for k in range(n_games)]
+            candidates = strategy.ask()
+            tasks = [(normalise(candidate), seeds, mode, max_pieces, cutoff)
+                     for candidate in candidates]
+            results = list(executor.map(_evaluate, tasks))
+            fitnesses = [value for value, _ in results]
+            n_stopped = sum(n_played < n_games for _, n_played in results)
+
+            # Only candidates that played every game can become the best
+            k = int(np.argmax(fitnesses))
+            complete = results[k][1] == n_games
+            if complete and (best["fitness"] is None or fitnesses[k] > best["fitness"]):
+                best = {"weights": normalise(candidates[k]), "fitness": fitnesses[k],
+                        "generation": strategy.generation}
+            cutoff = sorted(fitnesses, reverse=True)[len(strategy.weights) - 1] / 2
+            strategy.tell(candidates, fitnesses)
+            if checkpoint is not None:
+                save_checkpoint(checkpoint, strategy, best)
+            print(f"generation {strategy.generation}: best {max(fitnesses):.1f} "
+                  f"mean {np.mean(fitnesses):.1f} lines, sigma {strategy.sigma:.3f}, "
+                  f"{n_stopped} stopped early, {time.perf_counter() - start:.1f}s", flush=True)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the heuristic weights with CMA-ES.")
+    parser.add_argument("--generations", type=int, default=50)
+    parser.add_argument("--games", type=int, default=8, help="games per candidate")
+    parser.add_argument("--max-pieces", type=int, default=500, help="pieces per game")
+    parser.add_argument("--population", type=int, default=None, help="candidates per generation")
+    parser.add_argument("--sigma", type=float, default=0.3, help="initial step size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", default="snes", help="piece generator: snes or bag")
+    parser.add_argument("--workers", type=int, default=None, help="processes, all cores by default")
+    parser.add_argument("--checkpoint",
+                        help="JSON file saved every generation, resumed from if it exists")
+    args = parser.parse_args()
+
+    best = tune(args.generations, args.games, args.mode, args.max_pieces, args.sigma,
+                args.population, args.seed, args.checkpoint, args.workers)
+    print(f"best weights {best['weights']} with {best['fitness']} lines "
+          f"(generation {best['generation']})")
+
+
+if __name__ == '__main__':
+    main()
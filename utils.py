@@ -0,0 +1,84 @@
+import time
+
+
+class Timer:
+    """Gravity and key repeat timing, on the simulation clock in ms.
+
+    The game loop sets the clock with tick(now) before each logic step, so
+    the timing only depends on the number of steps, never on frame times.
+     - interval: time between two gravity steps
+     - delta: time left for the piece to slide before gravity, after a move
+     - soft_delay: delay between two repeats of a held movement key
+    """
+
+    def __init__(self, interval, delta, soft_delay):
+        self.interval = interval
+        self.delta_time = delta
+        self.soft_delay = soft_delay
+        self.now = 0
+        self.last_fall = 0
+        self.last_move = -soft_delay
+
+    def tick(self, now):
+        """Set the simulation clock."""
+        self.now = now
+
+    @property
+    def can_move_down(self):
+        """Whether gravity is due."""
+        return self.now - self.last_fall >= self.interval
+
+    @property
+    def can_soft_move(self):
+        """Whether a held movement key may repeat."""
+        return self.now - self.last_move >= self.soft_delay
+
+    def update(self):
+        """Restart the gravity interval after a gravity step."""
+        self.last_fall = self.now
+
+    def delta(self):
+        """Restart the key repeat delay and leave the piece time to slide after a move."""
+        self.last_move = self.now
+        self.last_fall = max(self.last_fall, self.now - self.interval + self.delta_time)
+
+    def set_on(self):
+        """Make gravity due now, so a hard dropped piece locks on this step."""
+        self.last_fall = self.now - self.interval
+
+
+class FixedTimestep:
+    """Run game logic at a fixed rate, whatever the frame rate.
+
+    advance() adds the wall time since its previous call to an accumulator
+    and returns how many steps of step_ms are due; step() consumes one. Time
+    beyond max_steps steps is dropped, so a stall doesn't make the game run
+    fast to catch up. With realtime=False every advance() is one step, to
+    run AIs and replays at full speed.
+    """
+
+    def __init__(self, step_ms, max_steps=5, realtime=True):
+        self.step_ms = step_ms
+        self.max_steps = max_steps
+        self.realtime = realtime
+        self.time = 0
+        self.accumulator = 0
+        self._last = None
+
+    def advance(self):
+        """Accumulate elapsed wall time and return the number of steps due."""
+        if not self.realtime:
+            self.accumulator = self.step_ms
+            return 1
+        now = time.perf_counter()
+        if self._last is not None:
+            self.accumulator += (now - self._last) * 1000
+        self._last = now
+        self.accumulator = min(self.accumulator, self.max_steps * self.step_ms)
+        return int(self.accumulator // self.step_ms)
+
+    def step(self):
+        """Consume one step and return the simulation time it runs at."""
+        self.time += self.step_ms
+        self.accumulator -= self.step_ms
+        return self.time
@@ -0,0 +1,443 @@
+"""Versus mode: an asyncio server hosting many two-player matches, and headless bot clients.
+
+    python versus.py serve --port 7777
+    python versus.py bots --bots 2 --policy heuristic
+    python versus.py loadtest --bots 400
+
+The server runs the authoritative engine for both games of every match and
+steps all matches on one fixed tick. Lines cleared send garbage to the
+opponent (GARBAGE_TABLE), cancelling incoming garbage first. Clients send
+their inputs as {"actions": [...]} and get one message per tick with the
+diffs of both games since the last message they were sent. Messages are
+JSON lines.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from engine import Piece, ACTIONS, N_ROWS, N_COLS, board_columns
+from pieces import BLOCK_TYPES, GARBAGE_TABLE
+from replay import Replay, MODES
+from selfplay import POLICIES, percentile
+
+PORT = 7777
+# Actions of one player applied per tick, the rest are dropped
+MAX_ACTIONS = 8
+# Bytes waiting to be sent to a client before it is skipped for a tick
+MAX_BUFFER = 1 << 16
+
+
+def encode(message):
+    """One JSON line of a message, as bytes."""
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def game_state(game, incoming=0):
+    """Everything a client needs to show a game, as a JSON-serialisable dict."""
+    piece = game.active_piece
+    return {
+        "cells": game.cells.hex(),
+        "piece": [piece.x, piece.y, piece.orientation],
+        "queue": [queued.kind for queued in game.queue],
+        "held": None if game.held_piece is None else game.held_piece.kind,
+        "can_hold": game.can_hold,
+        "score": game.score,
+        "lines": game.lines,
+        "n_pieces": game.n_pieces,
+        "game_over": game.game_over,
+        "incoming": incoming,
+    }
+
+
+def state_diff(old, new):
+    """The entries of state new that differ from state old."""
+    return {key: value for key, value in new.items() if old.get(key) != value}
+
+
+def apply_state(game, state, changed=None):
+    """Make a mirror game match state, rebuilding only the parts in changed (all by default).
+
+    The mirror starts as the match's Replay(seed, mode, queue).new_game().
+    """
+    if changed is None or "cells" in changed:
+        game.cells = bytearray.fromhex(state["cells"])
+        game.board = [sum(1 << i for i in range(N_COLS) if game.cells[N_COLS * j + i])
+                      for j in range(N_ROWS)]
+        game.columns = board_columns(game.board)
+    if changed is None or "queue" in changed:
+        for piece, kind in zip(game.queue, state["queue"]):
+            piece.respawn(BLOCK_TYPES[kind])
+    if changed is None or "held" in changed:
+        game.held_piece = None if state["held"] is None else Piece(BLOCK_TYPES[state["held"]])
+    piece = game.active_piece
+    piece.x, piece.y, piece.orientation = state["piece"]
+    game.can_hold = state["can_hold"]
+    game.score, game.lines = state["score"], state["lines"]
+    game.n_pieces, game.game_over = state["n_pieces"], state["game_over"]
+
+
+class Match:
+    """Two games on the same seed, sending garbage lines to each other."""
+
+    def __init__(self, seed, mode="snes", n_blocks_in_queue=3):
+        self.seed = seed
+        self.mode = mode
+        self.n_blocks_in_queue = n_blocks_in_queue
+        replay = Replay(seed, mode, n_blocks_in_queue)
+        self.games = (replay.new_game(), replay.new_game())
+        # Garbage lines waiting to be added to each game
+        self.pending = [0, 0]
+        self.rng = random.Random(seed)
+        self.ticks = 0
+
+    def step(self, actions, gravity=True):
+        """Step both games with their actions, exchange garbage, return both StepEvents.
+
+        Garbage is added to a game when its piece locks without clearing lines.
+        """
+        events = [game.step(action, gravity) for game, action in zip(self.games, actions)]
+        for player, step in enumerate(events):
+            if not step.locked:
+                continue
+            sent = GARBAGE_TABLE[step.lines_cleared]
+            cancelled = min(sent, self.pending[player])
+            self.pending[player] -= cancelled
+            self.pending[1 - player] += sent - cancelled
+            if not step.lines_cleared and self.pending[player]:
+                self.games[player].add_garbage(self.pending[player], self.rng.randrange(N_COLS))
+                self.pending[player] = 0
+        self.ticks += 1
+        return events
+
+    @property
+    def over(self):
+        """Whether either game is over."""
+        return any(game.game_over for game in self.games)
+
+    def winner(self):
+        """Index of the player still playing, else of the one with more lines, else None."""
+        alive = [not game.game_over for game in self.games]
+        if alive[0] != alive[1]:
+            return alive.index(True)
+        lines = [game.lines for game in self.games]
+        if lines[0] != lines[1]:
+            return lines.index(max(lines))
+        return None
+
+    def state(self, player):
+        """game_state of a player's game."""
+        return game_state(self.games[player], self.pending[player])
+
+
+class Player:
+    """A connected client: its queued actions and the states it was last sent."""
+
+    def __init__(self, name, writer):
+        self.name = name
+        self.writer = writer
+        self.actions = []
+        self.connected = True
+        # Own and opponent state as of the last message
+        self.sent = ({}, {})
+
+
+class MatchServer:
+    """Pair up clients into matches and step every match at tickrate.
+
+    Gravity applies every gravity_every ticks, and state diffs go out every
+    send_every ticks. A client that falls behind on reading is skipped, and
+    its next message carries every change it missed. Matches end when a game
+    is over, a player disconnects (and forfeits) or after max_ticks.
+    """
+
+    def __init__(self, tickrate=30, gravity_every=15, send_every=1, mode="snes",
+                 n_blocks_in_queue=3, max_ticks=None, seed=None):
+        self.tickrate = tickrate
+        self.gravity_every = gravity_every
+        self.send_every = send_every
+        self.mode = mode
+        self.n_blocks_in_queue = n_blocks_in_queue
+        self.max_ticks = max_ticks
+        self.rng = random.Random(seed)
+        self.waiting = None
+        # Running match -> its two players
+        self.matches = {}
+        self.n_played = 0
+        self.n_ticks = 0
+        self.n_late = 0
+        self.n_messages = 0
+        self.n_bytes = 0
+        self.tick_times = deque(maxlen=10000)
+
+    async def handle(self, reader, writer):
+        """Serve one client: pair it up, then queue its actions until it disconnects."""
+        try:
+            hello = json.loads(await reader.readline())
+        except (ValueError, ConnectionError):
+            hello = None
+        if not isinstance(hello, dict):
+            writer.close()
+            return
+        player = Player(str(hello.get("name", "anonymous")), writer)
+        if self.waiting is None:
+            self.waiting = player
+        else:
+            self.start_match(self.waiting, player)
+            self.waiting = None
+        # A malformed message ends the connection, which forfeits the match
+        try:
+            while line := await reader.readline():
+                actions = json.loads(line).get("actions", [])
+                if not isinstance(actions, list):
+                    break
+                player.actions.extend(action for action in actions if action in ACTIONS)
+        except (ValueError, TypeError, AttributeError, ConnectionError):
+            pass
+        finally:
+            player.connected = False
+            if self.waiting is player:
+                self.waiting = None
+            writer.close()
+
+    def start_match(self, *players):
+        """Start a match on a new seed and tell both players."""
+        match = Match(self.rng.getrandbits(63), self.mode, self.n_blocks_in_queue)
+        for k, player in enumerate(players):
+            self.send(player, {"start": {"seed": match.seed, "mode": match.mode,
+                                         "queue": match.n_blocks_in_queue, "player": k,
+                                         "opponent": players[1 - k].name}})
+        self.matches[match] = players
+
+    def send(self, player, message):
+        """Write a message to a player, without waiting for it to be sent."""
+        data = encode(message)
+        player.writer.write(data)
+        self.n_messages += 1
+        self.n_bytes += len(data)
+
+    def tick(self):
+        """Step every match once, send the state diffs and finish the matches that ended."""
+        for match, players in list(self.matches.items()):
+            actions = []
+            for player in players:
+                actions.append(player.actions[:MAX_ACTIONS])
+                player.actions = []
+            match.step(actions, match.ticks % self.gravity_every == 0)
+            forfeit = [not player.connected for player in players]
+            done = match.over or any(forfeit) or match.ticks == self.max_ticks
+            if done or match.ticks % self.send_every == 0:
+                self.send_states(match, players, done)
+            if done:
+                self.finish(match, players, forfeit)
+        self.n_ticks += 1
+
+    def send_states(self, match, players, force=False):
+        """Send each player what changed in both games since its last message."""
+        states = (match.state(0), match.state(1))
+        for k, player in enumerate(players):
+            if not player.connected or (
+                    not force and player.writer.transport.get_write_buffer_size() > MAX_BUFFER):
+                continue
+            message = {}
+            for key, state, sent in (("you", states[k], player.sent[0]),
+                                     ("opponent", states[1 - k], player.sent[1])):
+                diff = state_diff(sent, state)
+                if diff:
+                    message[key] = diff
+                    sent.update(diff)
+            if message:
+                message["tick"] = match.ticks
+                self.send(player, message)
+
+    def finish(self, match, players, forfeit):
+        """Send the result to both players and close their connections."""
+        if any(forfeit):
+            winner = None if all(forfeit) else forfeit.index(False)
+        else:
+            winner = match.winner()
+        for k, player in enumerate(players):
+            if player.connected:
+                result = "draw" if winner is None else "win" if winner == k else "lose"
+                game = match.games[k]
+                self.send(player, {"result": result, "score": game.score, "lines": game.lines,
+                                   "ticks": match.ticks})
+                player.writer.close()
+        del self.matches[match]
+        self.n_played += 1
+
+    async def run(self):
+        """Tick until cancelled, skipping ticks rather than catching up when late."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            start = time.perf_counter()
+            self.tick()
+            self.tick_times.append(time.perf_counter() - start)
+            next_tick += 1 / self.tickrate
+            delay = next_tick - loop.time()
+            if delay < 0:
+                self.n_late += 1
+                next_tick = loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+    def stats(self):
+        """Counters and tick durations (ms) so far."""
+        times = [t * 1000 for t in self.tick_times] or [0.0]
+        return {
+            "matches_running": len(self.matches),
+            "matches_played": self.n_played,
+            "ticks": self.n_ticks,
+            "late_ticks": self.n_late,
+            "messages": self.n_messages,
+            "bytes": self.n_bytes,
+            "tick_ms_mean": sum(times) / len(times),
+            "tick_ms_p95": percentile(times, 95),
+            "tick_ms_max": max(times),
+        }
+
+
+async def serve(host="127.0.0.1", port=PORT, **options):
+    """Run a MatchServer on host:port until cancelled."""
+    server = MatchServer(**options)
+    listener = await asyncio.start_server(server.handle, host, port, backlog=1024)
+    print(f"serving on {host}:{port}", file=sys.stderr)
+    async with listener:
+        await server.run()
+
+
+async def play_bot(host="127.0.0.1", port=PORT, policy_name="random", name="bot"):
+    """Play one match with a selfplay policy, return the result message.
+
+    The bot keeps a mirror of its game from the state diffs, and answers
+    every message with the policy's next action.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(encode({"name": name}))
+        start = json.loads(await reader.readline())["start"]
+        game = Replay(start["seed"], start["mode"], start["queue"]).new_game()
+        policy = POLICIES[policy_name]()
+        policy.reset()
+        state = {}
+        while line := await reader.readline():
+            message = json.loads(line)
+            if "result" in message:
+                return message
+            if "you" in message:
+                state.update(message["you"])
+                apply_state(game, state, message["you"])
+            if not game.game_over:
+                writer.write(encode({"actions": [policy.next_action(game)]}))
+        return {"result": "disconnected"}
+    finally:
+        writer.close()
+
+
+async def load_test(n_bots=200, policy_name="random", n_processes=None, **options):
+    """Serve n_bots bots on a local port, return their results, the server stats and the time.
+
+    The bots run in n_processes processes, by default one per CPU the
+    server leaves free. With n_processes=0 (the default on one CPU) they run
+    in the server's event loop, between ticks. Either way they compete with
+    the server for CPU time unless it has a core to itself, so a slow policy
+    shows up as late ticks; the random policy gives the numbers closest to
+    the server's own.
+    """
+    if n_bots % 2:
+        raise ValueError("the number of bots must be even")
+    if n_processes is None:
+        n_processes = (os.cpu_count() or 1) - 1
+    n_processes = min(n_processes, n_bots)
+    server = MatchServer(**options)
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0, backlog=max(n_bots, 100))
+    port = listener.sockets[0].getsockname()[1]
+    ticker = asyncio.create_task(server.run())
+    start = time.perf_counter()
+    try:
+        if not n_processes:
+            results = await _bots("127.0.0.1", port, n_bots, policy_name)
+        else:
+            loop = asyncio.get_running_loop()
+            # Bots first[k] to first[k + 1] - 1 run in process k
+            first = [n_bots * k // n_processes for k in range(n_processes + 1)]
+            with ProcessPoolExecutor(n_processes) as pool:
+                batches = await asyncio.gather(*(
+                    loop.run_in_executor(pool, _run_bots, "127.0.0.1", port,
+                                         first[k + 1] - first[k], policy_name, first[k])
+                    for k in range(n_processes)))
+            results = [result for batch in batches for result in batch]
+    finally:
+        ticker.cancel()
+        listener.close()
+    return results, server.stats(), time.perf_counter() - start
+
+
+async def _bots(host, port, n_bots, policy_name, first=0):
+    """Play n_bots bots named bot<first> onwards at once, return their results."""
+    return await asyncio.gather(*(play_bot(host, port, policy_name, f"bot{k}")
+                                  for k in range(first, first + n_bots)))
+
+
+def _run_bots(host, port, n_bots, policy_name, first=0):
+    """Play _bots in an event loop of this (worker) process."""
+    return asyncio.run(_bots(host, port, n_bots, policy_name, first))
+
+
+def main():
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("--tickrate", type=int, default=30, help="ticks per second")
+    options.add_argument("--gravity-every", type=int, default=15, help="ticks per gravity step")
+    options.add_argument("--send-every", type=int, default=1, help="ticks per state message")
+    options.add_argument("--mode", choices=MODES, default="snes", help="piece generator")
+    options.add_argument("--max-ticks", type=int, default=None, help="ticks before a match ends")
+    parser = argparse.ArgumentParser(description="Versus mode match server, bots and load test.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", parents=[options], help="run a match server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=PORT)
+    bots_parser = commands.add_parser("bots", help="connect bots to a server")
+    bots_parser.add_argument("--host", default="127.0.0.1")
+    bots_parser.add_argument("--port", type=int, default=PORT)
+    bots_parser.add_argument("--bots", type=int, default=1)
+    bots_parser.add_argument("--policy", choices=POLICIES, default="heuristic")
+    load_parser = commands.add_parser("loadtest", parents=[options],
+                                      help="serve bots on localhost and report the server load")
+    load_parser.add_argument("--bots", type=int, default=200, help="an even number of bots")
+    load_parser.add_argument("--policy", choices=POLICIES, default="random",
+                             help="random measures the server best, other policies load the CPUs")
+    load_parser.add_argument("--processes", type=int, default=None,
+                             help="processes to run the bots in (0: the server's), "
+                                  "one per spare CPU by default")
+    args = parser.parse_args()
+
+    if args.command == "bots":
+        results = asyncio.run(_bots(args.host, args.port, args.bots, args.policy))
+        for result in results:
+            print(json.dumps(result))
+        return
+    server_options = dict(tickrate=args.tickrate, gravity_every=args.gravity_every,
+                          send_every=args.send_every, mode=args.mode, max_ticks=args.max_ticks)
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port, **server_options))
+        return
+    if args.bots % 2:
+        parser.error("--bots must be even")
+    results, stats, elapsed = asyncio.run(load_test(args.bots, args.policy, args.processes,
+                                                    **server_options))
+    outcomes = [result["result"] for result in results]
+    print(f"{len(results)} bots, {stats['matches_played']} matches in {elapsed:.1f}s: "
+          + ", ".join(f"{outcomes.count(outcome)} {outcome}"
+                      for outcome in ("win", "lose", "draw", "disconnected")))
+    print(f"{stats['ticks']} ticks, {stats['late_ticks']} late, "
+          f"tick {stats['tick_ms_mean']:.2f} ms mean, {stats['tick_ms_p95']:.2f} ms p95, "
+          f"{stats['tick_ms_max']:.2f} ms max")
+    print(f"{stats['messages']} messages, {stats['bytes'] / elapsed / 1000:.1f} kB/s")
+
+
+if __name__ == '__main__':
+    main()